@@ -0,0 +1,198 @@
+import argparse
+import itertools
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from lab1.route_search import tsp_bfs, tsp_bfs_compact, tsp_dfs, tsp_dfs_bnb, tsp_dfs_parallel, tsp_held_karp
+from lab2.greedy import tsp_nn, tsp_greedy, tsp_greedy_edge
+from lab2.lin_kernighan import tsp_lk
+from lab2.local_search import improve_tour
+from lab3.astar import HEURISTICS, astar
+from lab4.aco import aco
+from tsp_utils import *
+
+# Every solver is registered as solver(map, start_city, rng, stats) -> (path, cost), with
+# the largest n it is run on; exact solvers also give the reference cost unless they
+# report stats['timed_out'], the search solvers run under SEARCH_BUDGET at any n.
+
+SOLVERS = {}
+
+def register(name, solver, max_n=None, exact=False):
+    SOLVERS[name] = {'solver': solver, 'max_n': max_n, 'exact': exact}
+
+def improved(constructor):
+    # a constructor followed by 2-opt / Or-opt
+    def solver(map, start_city, rng, stats):
+        path, _ = constructor(map, start_city, rng, stats)
+        return improve_tour(map, path)
+    return solver
+
+ACO_PARAMS = dict(n_ants=100, n_iterations=1000, alpha=1, beta=1, evaporation=0.1, Q=1, patience=100)
+SEARCH_BUDGET = dict(time_limit=10.0, max_nodes=2_000_000)
+
+register('bfs', lambda map, start_city, rng, stats: tsp_bfs(map, start_city, stats, **SEARCH_BUDGET), exact=True)
+register('bfs_compact', lambda map, start_city, rng, stats: tsp_bfs_compact(map, start_city, stats, **SEARCH_BUDGET),
+         max_n=63, exact=True)
+register('dfs', lambda map, start_city, rng, stats: tsp_dfs(map, start_city, stats, **SEARCH_BUDGET), exact=True)
+register('dfs_bnb', lambda map, start_city, rng, stats: tsp_dfs_bnb(map, start_city, stats, **SEARCH_BUDGET),
+         exact=True)
+register('dfs_parallel', lambda map, start_city, rng, stats:
+         tsp_dfs_parallel(map, start_city, stats=stats, **SEARCH_BUDGET), exact=True)
+register('held_karp', lambda map, start_city, rng, stats: tsp_held_karp(map, start_city), max_n=16, exact=True)
+for heuristic in HEURISTICS:
+    register(f'astar_{heuristic}', lambda map, start_city, rng, stats, heuristic=heuristic:
+             astar(map, start_city, heuristic, stats, **SEARCH_BUDGET), exact=True)
+register('nn', lambda map, start_city, rng, stats: tsp_nn(map, start_city, candidates=10))
+register('greedy', lambda map, start_city, rng, stats: tsp_greedy(map, start_city), max_n=500)
+register('greedy_edge', lambda map, start_city, rng, stats: tsp_greedy_edge(map, start_city))
+register('nn_ls', improved(SOLVERS['nn']['solver']))
+register('greedy_edge_ls', improved(SOLVERS['greedy_edge']['solver']))
+register('lk', lambda map, start_city, rng, stats: tsp_lk(map, start_city, time_limit=1.0, rng=rng))
+for strategy in ('as', 'mmas', 'acs'):
+    register(f'aco_{strategy}', lambda map, start_city, rng, stats, strategy=strategy:
+             aco(map, start_city, rng=rng, strategy=strategy, stats=stats, **ACO_PARAMS), max_n=200)
+
+def instance(n, density, symmetric, seed):
+    # the same cities and map for the same (n, density, symmetric, seed), from the on-disk store
+    return load_instance(n, density, symmetric, seed)
+
+def tour_ok(map, path, cost):
+    # a closed tour through every city whose cost matches its roads
+    if path is None or cost is None or cost < 0 or not np.isfinite(cost):
+        return False
+    n = len(map)
+    if len(path) != n + 1 or path[0] != path[-1] or sorted(path[:-1]) != list(range(n)):
+        return False
+    w = road_costs(map)
+    return bool(np.isclose(w[path[:-1], path[1:]].sum(), cost))
+
+def measure(solver, map, start_city, seed, repeats, memory):
+    # best-of-repeats wall time with perf_counter; peak traced memory from one extra run
+    times = []
+    for _ in range(repeats):
+        rng = np.random.default_rng(seed)
+        stats = {}
+        start_time = time.perf_counter()
+        path, cost = solver(map, start_city, rng, stats)
+        times.append(time.perf_counter() - start_time)
+    peak = np.nan
+    if memory:
+        tracemalloc.start()
+        solver(map, start_city, np.random.default_rng(seed), {})
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return path, cost, times, peak, stats
+
+def run(solvers=None, sizes=(8,), densities=(1.0,), symmetric=(True, False), seeds=(0,), repeats=3,
+        memory=True, start_city=0, verbose=True):
+    # every solver on every instance of the matrix, one row per (solver, instance);
+    # gap is relative to the exact cost when an exact solver covers n, else to the best found
+    solvers = list(SOLVERS) if solvers is None else list(solvers)
+    rows = []
+    for n, density, sym, seed in itertools.product(sizes, densities, symmetric, seeds):
+        _, map = instance(n, density, sym, seed)
+        found = []
+        for name in solvers:
+            entry = SOLVERS[name]
+            if entry['max_n'] is not None and n > entry['max_n']:
+                continue
+            path, cost, times, peak, stats = measure(entry['solver'], map, start_city, seed, repeats, memory)
+            ok = tour_ok(map, path, cost)
+            timed_out = stats.get('timed_out', False)
+            found.append({
+                'solver': name, 'n': n, 'density': density, 'symmetric': sym, 'seed': seed,
+                'time_min': min(times), 'time_median': float(np.median(times)), 'repeats': repeats,
+                'peak_kib': peak, 'cost': float(cost) if ok else np.nan, 'ok': ok,
+                'exact': entry['exact'] and not timed_out, 'timed_out': timed_out,
+                'lower_bound': stats.get('lower_bound', np.nan),
+            })
+            if verbose:
+                print(f"{name:>16} n={n} density={density} symmetric={sym} seed={seed}: "
+                      f"{min(times):.4f}s cost={found[-1]['cost']:.4f}")
+
+        # reference: the exact optimum if one was computed, else the best cost seen
+        costs = [r['cost'] for r in found if r['ok']]
+        exact = [r['cost'] for r in found if r['ok'] and r['exact']]
+        if not exact and n <= SOLVERS['held_karp']['max_n']:
+            path, cost = tsp_held_karp(map, start_city)
+            exact = [cost] if path is not None else []
+        ref = min(exact) if exact else min(costs, default=np.nan)
+        for r in found:
+            r['reference'] = ref
+            r['reference_kind'] = 'exact' if exact else 'best'
+            r['gap'] = (r['cost'] - ref) / ref if ref and np.isfinite(ref) else np.nan
+        rows += found
+    return pd.DataFrame(rows)
+
+def save(results, path):
+    # .json gives a list of records, anything else CSV
+    if str(path).endswith('.json'):
+        results.to_json(path, orient='records', indent=1)
+    else:
+        results.to_csv(path, index=False)
+
+def load(path):
+    return pd.read_json(path) if str(path).endswith('.json') else pd.read_csv(path)
+
+def compare(old, new):
+    # per (solver, instance) time ratio and cost change between two saved runs
+    keys = ['solver', 'n', 'density', 'symmetric', 'seed']
+    old, new = (load(r) if isinstance(r, str) else r for r in (old, new))
+    both = old.merge(new, on=keys, suffixes=('_old', '_new'))
+    both['speedup'] = both['time_min_old'] / both['time_min_new']
+    both['cost_change'] = both['cost_new'] - both['cost_old']
+    return both[keys + ['time_min_old', 'time_min_new', 'speedup', 'cost_old', 'cost_new', 'cost_change']]
+
+def summary(results):
+    # aggregate over seeds: median time, mean gap, worst peak memory, solved share
+    return (results.groupby(['solver', 'n', 'density', 'symmetric'], sort=False)
+            .agg(time=('time_min', 'median'), gap=('gap', 'mean'), peak_kib=('peak_kib', 'max'), solved=('ok', 'mean'),
+                 timed_out=('timed_out', 'mean'))
+            .reset_index())
+
+def report(results):
+    pd.set_option('display.width', 160)
+    pd.set_option('display.float_format', '{:.4f}'.format)
+    print(summary(results).to_string(index=False))
+
+def lab_main(solvers, num_cities, density, symmetric, debug, seed=0):
+    # the main() of the lab modules: one instance, the lab's solvers, a results table
+    if debug:
+        cities, map = instance(num_cities, density, symmetric, seed)
+        [print(c) for c in cities]
+        print("Map:")
+        map_print(num_cities, map)
+    results = run(solvers, [num_cities], [density], [symmetric], [seed], repeats=1, memory=False, verbose=False)
+    report(results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the registered TSP solvers.")
+    parser.add_argument('--solvers', nargs='+', default=None, choices=list(SOLVERS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[8])
+    parser.add_argument('--densities', nargs='+', type=float, default=[1.0, 0.8])
+    parser.add_argument('--symmetric', nargs='+', type=int, choices=[0, 1], default=[1, 0])
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--out', default=None, help="write results to a .csv or .json file")
+    parser.add_argument('--compare', default=None, help="earlier results to compare against")
+    args = parser.parse_args()
+
+    results = run(args.solvers, args.sizes, args.densities, [bool(s) for s in args.symmetric], args.seeds,
+                  args.repeats, memory=not args.no_memory)
+    print()
+    report(results)
+    if args.out:
+        save(results, args.out)
+    if args.compare:
+        print()
+        print(compare(args.compare, results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
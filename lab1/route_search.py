@@ -1,121 +1,431 @@
-import random
-import pandas as pd
-
-class City:
-    def __init__(self, name, x, y ,z):
-        self.name = name
-        self.x = x
-        self.y = y
-        self.z = z
-    def __str__(self):
-        return f"{self.name} ({self.x}, {self.y}, {self.z})"
-    
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Value
 
-def gen_coordinates():
-    x = random.uniform(-100, 100)
-    y = random.uniform(-100, 100)
-    z = random.uniform(0, 50)
-
-    return x, y, z
-
-def gen_cities(n):
-    cities = []
-    for i in range(n):
-        x, y, z = gen_coordinates()
-        name = f"city{i}"
-        cities.append(City(name, x, y, z))
-    return cities
-
-def map_print(n, map):
-    df = pd.DataFrame(map)
-        
-    df.index = [f"City {i}" for i in range(n)]
-    df.columns = [f"City {j}" for j in range(n)]
-    
-    pd.set_option('display.precision', 2)
-    pd.set_option('display.float_format', '{:.2f}'.format)
-    
-    print(df)
-
-def euclidean_distance(city1, city2):
-    distance = ((city1.x - city2.x)**2 + (city1.y - city2.y)**2 + (city1.z - city2.z)**2)**0.5
-    return distance
-
-def gen_map(cities, n, density, symmetric):
-    map = [[0 for _ in range(n)] for _ in range(n)]
-    for i in range(n):
-        for j in range(n):
-            if random.random() <= density:
-                if symmetric:
-                    map[i][j] = euclidean_distance(cities[i], cities[j])
-                    map[j][i] = map[i][j]
-                else:
-                    if i != j:
-                        distance = euclidean_distance(cities[i], cities[j])
-                        if cities[i].z < cities[j].z:
-                            distance *= 1.1
-                        elif cities[i].z > cities[j].z:
-                            distance *= 0.9
-                        map[i][j] = distance
-    return map
-
-def tsp_bfs(map, start_city):
+import numpy as np
+
+from tsp_utils import *
+
+EPS = 1e-9
+
+def frontier_bound(frontier, incumbent):
+    # lower bound on the optimum when a search stops early: the incumbent, or for some
+    # open (city, path, cost, out_rest) node its cost plus out_rest, one cheapest exit
+    # from the current city and from every city not on its path
+    return min(incumbent, min((cost + out_rest for _, _, cost, out_rest in frontier), default=float('inf')))
+
+def tsp_bfs(map, start_city, stats=None, time_limit=None, max_nodes=None):
     n = len(map)
+    # out-roads per city in index order, and the road back to start_city
+    roads = as_roads(map)
+    adj = [sorted(row) for row in roads.rows()]
+    back = [roads.cost(i, start_city) for i in range(n)]
+    min_out = roads.min_out().tolist()
+
+    budget = Budget(time_limit, max_nodes)
 
-    queue = [(start_city, [start_city], 0)]
+    # (city, path, cost, sum of min_out over the current city and the cities not on path)
+    queue = deque([(start_city, [start_city], 0, sum(min_out))])
 
     best_path = None
     min_cost = float('inf')
 
     while queue:
-        city, path, cost = queue.pop(0) # FIFO
+        if budget.spent():
+            break
+        city, path, cost, out_rest = queue.popleft() # FIFO
 
         if len(path) == n:
-            if map[city][start_city] > 0:
-                cost += map[city][start_city]
+            if back[city] < float('inf'):
+                cost += back[city]
                 if cost < min_cost:
                     min_cost = cost
                     best_path = path + [start_city]
         else:
-            for next_city in range(n):
-                if next_city not in path and map[city][next_city] != 0:
-                    queue.append((next_city, path + [next_city], cost + map[city][next_city]))
+            out_next = out_rest - min_out[city]
+            for next_city, road in adj[city]:
+                if next_city not in path:
+                    queue.append((next_city, path + [next_city], cost + road, out_next))
+
+    search_stats(stats, budget, frontier_bound(queue, min_cost))
+    return best_path, min_cost
+
+def mask_bound(min_out, city, mask, cost, chunk=1 << 16):
+    # frontier_bound for compact nodes: lowest cost plus one cheapest exit from the
+    # current city and from every city not in the visited mask, chunk by chunk; the
+    # min_out sum of the visited cities is read byte by byte of the mask from tables
+    total = min_out.sum()
+    if not len(cost) or total == np.inf:
+        return float('inf')
+    n = len(min_out)
+    byte = np.arange(256)
+    tables = [sum(np.where((byte >> b) & 1, min_out[8 * k + b], 0.0) for b in range(min(8, n - 8 * k)))
+              for k in range((n + 7) // 8)]
+    bound = np.inf
+    for lo in range(0, len(cost), chunk):
+        hi = min(lo + chunk, len(cost))
+        m = mask[lo:hi]
+        visited = sum(table[(m >> (8 * k)) & 255] for k, table in enumerate(tables))
+        bound = min(bound, float((cost[lo:hi] - visited + min_out[city[lo:hi]]).min()))
+    return float(bound + total)
+
+def expandable(w, bits, city, mask):
+    # (nodes, n) table of the moves open to each compact node: a road and not yet visited
+    return (((mask[:, None] >> bits) & 1) == 0) & np.isfinite(w[city])
+
+def tsp_bfs_compact(map, start_city, stats=None, time_limit=None, max_nodes=None, chunk=1 << 16):
+    # level-by-level BFS over flat arrays: a frontier node is its city (int16), visited
+    # mask (int64), cost (float64) and the index of its parent in the level above (int32),
+    # 22 bytes instead of a tuple holding its own path list; expanded levels keep only
+    # city and parent (6 bytes) so the winner's path can be rebuilt at the end
+    n = len(map)
+    if n > 63:
+        raise ValueError("tsp_bfs_compact supports at most 63 cities")
+    w = road_costs(map)
+    min_out = w.min(axis=1)
+    bits = np.arange(n, dtype=np.int64)
+    budget = Budget(time_limit, max_nodes)
+
+    city = np.array([start_city], dtype=np.int16)
+    mask = np.array([1 << start_city], dtype=np.int64)
+    cost = np.zeros(1)
+    levels = [(city, np.array([-1], dtype=np.int32))]
+
+    for depth in range(1, n):
+        # first pass counts the children so the next level is allocated exactly once
+        counts = []
+        for lo in range(0, len(city), chunk):
+            hi = min(lo + chunk, len(city))
+            if budget.spent(hi - lo):
+                # out of budget: bound this level's nodes, none of them fully expanded
+                search_stats(stats, budget, mask_bound(min_out, city, mask, cost, chunk), depth=depth)
+                return None, float('inf')
+            counts.append(int(expandable(w, bits, city[lo:hi], mask[lo:hi]).sum()))
+
+        # second pass fills them in FIFO order: parent by parent, next city by index
+        size = sum(counts)
+        child = np.empty(size, dtype=np.int16)
+        child_mask = np.empty(size, dtype=np.int64)
+        child_cost = np.empty(size)
+        parent = np.empty(size, dtype=np.int32)
+        at = 0
+        for lo, count in zip(range(0, len(city), chunk), counts):
+            if budget.expired():
+                search_stats(stats, budget, mask_bound(min_out, city, mask, cost, chunk), depth=depth)
+                return None, float('inf')
+            hi = min(lo + chunk, len(city))
+            c, m, g = city[lo:hi], mask[lo:hi], cost[lo:hi]
+            p, j = np.nonzero(expandable(w, bits, c, m))
+            child[at:at + count] = j
+            child_mask[at:at + count] = m[p] | (np.int64(1) << j)
+            child_cost[at:at + count] = g[p] + w[c[p], j]
+            parent[at:at + count] = p + lo
+            at += count
+
+        city, mask, cost = child, child_mask, child_cost
+        levels.append((city, parent))
+        if not size:
+            break
+
+    # close every full path back to start_city, keep the first cheapest like tsp_bfs
+    total = cost + w[city, start_city] if len(levels) == n else np.empty(0)
+    if not len(total) or not np.isfinite(total.min()):
+        search_stats(stats, budget, float('inf'), depth=n)
+        return None, float('inf')
+    k = int(np.argmin(total))
+    min_cost = float(total[k])
+
+    path = []
+    for level_city, level_parent in reversed(levels):
+        path.append(int(level_city[k]))
+        k = level_parent[k]
+    best_path = path[::-1] + [start_city]
+    search_stats(stats, budget, min_cost, depth=n)
     return best_path, min_cost
 
-def tsp_dfs(map, start_city):
+def tsp_dfs(map, start_city, stats=None, time_limit=None, max_nodes=None):
     n = len(map)
+    roads = as_roads(map)
+    adj = [sorted(row, reverse=True) for row in roads.rows()]
+    back = [roads.cost(i, start_city) for i in range(n)]
+    min_out = roads.min_out().tolist()
+
+    budget = Budget(time_limit, max_nodes)
 
-    stack = [(start_city, [start_city], 0)] # LIFO
+    stack = [(start_city, [start_city], 0, sum(min_out))] # LIFO
 
     best_path = None
     min_cost = float('inf')
 
     while stack:
-        city, path, cost = stack.pop()
+        if budget.spent():
+            break
+        city, path, cost, out_rest = stack.pop()
 
         if len(path) == n:
-            if map[city][start_city] > 0:
-                cost += map[city][start_city]
+            if back[city] < float('inf'):
+                cost += back[city]
                 if cost < min_cost:
                     min_cost = cost
                     best_path = path + [start_city]
         else:
-            for next_city in range(n-1, -1, -1):
-                if next_city not in path and map[city][next_city] > 0:
-                    stack.append((next_city, path + [next_city], cost + map[city][next_city]))
+            out_next = out_rest - min_out[city]
+            for next_city, road in adj[city]:
+                if next_city not in path:
+                    stack.append((next_city, path + [next_city], cost + road, out_next))
+
+    search_stats(stats, budget, frontier_bound(stack, min_cost))
     return best_path, min_cost
 
+def tsp_dfs_bnb(map, start_city, stats=None, time_limit=None, max_nodes=None):
+    n = len(map)
+    inf = float('inf')
+    roads = as_roads(map)
+    rows = roads.rows()
+    back = [roads.cost(i, start_city) for i in range(n)]
+
+    # admissible bound: every city still has to be left once and entered once
+    min_out = roads.min_out().tolist()
+    min_in = roads.min_in().tolist()
+
+    # children ordered by edge cost, most expensive pushed first so the cheapest is popped first
+    children = [[(j, c) for j, c in reversed(row) if j != start_city] for row in rows]
+
+    budget = Budget(time_limit, max_nodes)
+    best_path = None
+    min_cost = inf
+    expanded = pruned = 0
+    path = [start_city] * n   # path[:depth] is valid for the node being expanded
+
+    # (city, visited mask, cost, depth, sum of min_out left, sum of min_in left)
+    stack = [(start_city, 1 << start_city, 0, 1, sum(min_out), sum(min_in))] # LIFO
+
+    while stack:
+        if budget.spent():
+            break
+        city, mask, cost, depth, out_rest, in_rest = stack.pop()
+
+        # the incumbent may have improved since this node was pushed
+        if cost + max(out_rest, in_rest) >= min_cost:
+            pruned += 1
+            continue
+        expanded += 1
+        path[depth - 1] = city
+
+        if depth == n:
+            if back[city] < inf:
+                cost += back[city]
+                if cost < min_cost:
+                    min_cost = cost
+                    best_path = path + [start_city]
+            continue
+
+        out_next = out_rest - min_out[city]
+        for next_city, road in children[city]:
+            if mask & (1 << next_city):
+                continue
+            next_cost = cost + road
+            in_next = in_rest - min_in[next_city]
+            if next_cost + max(out_next, in_next) >= min_cost:
+                pruned += 1
+                continue
+            stack.append((next_city, mask | (1 << next_city), next_cost, depth + 1, out_next, in_next))
+
+    # every open node carries its own admissible bound
+    lower_bound = min([cost + max(out_rest, in_rest) for _, _, cost, _, out_rest, in_rest in stack], default=inf)
+    search_stats(stats, budget, min(lower_bound, min_cost), expanded=expanded, pruned=pruned)
+    return best_path, min_cost
 
-def main(num_cities, density, symmetric, debug):
-    #generate cities
+
+# per-process copy of the roads plus the shared best tour cost and node count
+dfs_state = {}
+
+def init_dfs_worker(children, back, min_out, start_city, best, nodes, deadline, max_nodes):
+    dfs_state.update(children=children, back=back, min_out=min_out, start_city=start_city,
+                     best=best, best_raw=best.get_obj(), # reads skip the lock
+                     nodes=nodes, deadline=deadline, max_nodes=max_nodes)
+
+def dfs_budget_spent(count):
+    # add count popped nodes to the shared total; whether the budget of the whole
+    # search is used up (the deadline is wall-clock time, the same in every worker)
+    st = dfs_state
+    with st['nodes'].get_lock():
+        st['nodes'].value += count
+        nodes = st['nodes'].value
+    if st['max_nodes'] is not None and nodes > st['max_nodes']:
+        return True
+    return st['deadline'] is not None and time.time() >= st['deadline']
+
+def dfs_subtree(prefix, cost):
+    # exhaustive DFS below the fixed path prefix, pruning against the best cost any
+    # worker has found; a node is only cut when its bound is above that cost by more
+    # than EPS, so every tour tied with the optimum is still reached and the first of
+    # them in DFS order wins, whatever the timing between workers.
+    # The budget is checked every 1024 popped nodes; when it runs out the subtree
+    # also returns the lowest bound left on its stack
+    st = dfs_state
+    children, back, min_out = st['children'], st['back'], st['min_out']
+    best, best_raw = st['best'], st['best_raw']
+    n = len(children)
+    inf = float('inf')
+
+    mask = 0
+    for c in prefix:
+        mask |= 1 << c
+    out_rest = sum(min_out) - sum(min_out[c] for c in prefix[:-1])
+    stack = [(prefix[-1], mask, cost, len(prefix), out_rest)]
+    path = list(prefix) + [st['start_city']] * (n - len(prefix))
+
+    best_path = None
+    min_cost = inf
+    limit = best_raw.value
+    expanded = pruned = popped = charged = 0
+    out = False
+
+    while stack:
+        if not popped & 1023:
+            limit = min(limit, best_raw.value)
+            out = dfs_budget_spent(popped - charged)
+            charged = popped
+            if out:
+                break
+        popped += 1
+        city, mask, cost, depth, out_rest = stack.pop()
+        if cost + out_rest > limit + EPS:
+            pruned += 1
+            continue
+        expanded += 1
+        path[depth - 1] = city
+
+        if depth == n:
+            if back[city] < inf and cost + back[city] < min_cost:
+                min_cost = cost + back[city]
+                best_path = path + [st['start_city']]
+                with best.get_lock():
+                    if min_cost < best.value:
+                        best.value = min_cost
+                limit = min(limit, best_raw.value)
+            continue
+
+        out_next = out_rest - min_out[city]
+        for next_city, road in children[city]:
+            if not mask & (1 << next_city):
+                stack.append((next_city, mask | (1 << next_city), cost + road, depth + 1, out_next))
+
+    dfs_budget_spent(popped - charged)
+    bound = min([cost + out_rest for _, _, cost, _, out_rest in stack], default=inf) if out else inf
+    return best_path, min_cost, expanded, pruned, popped, out, bound
+
+def tsp_dfs_parallel(map, start_city, workers=None, stats=None, prefix_depth=3, time_limit=None, max_nodes=None):
+    # exact DFS split into the subtrees below every path prefix of prefix_depth cities,
+    # searched by a process pool that shares the best cost in a shared-memory Value;
+    # ties go to the earliest subtree, so the tour does not depend on the worker count
+    # (unless the budget runs out, which stops every subtree at whatever it has reached)
+    n = len(map)
+    inf = float('inf')
+    roads = as_roads(map)
+    back = [roads.cost(i, start_city) for i in range(n)]
+    min_out = roads.min_out().tolist()
+    if n < 3 or inf in min_out:
+        # too few cities to split, or a city without a road out: plain DFS
+        path, cost = tsp_dfs(map, start_city, stats, time_limit, max_nodes)
+        if stats is not None:
+            stats.update(expanded=stats['nodes'], pruned=0, subtrees=0)
+        return path, cost
+
+    # children cheapest first, most expensive pushed first so the cheapest is popped first
+    children = [[(j, c) for j, c in reversed(row) if j != start_city] for row in roads.rows()]
+
+    # the path prefixes in DFS order
+    prefixes = [([start_city], 0)]
+    for _ in range(min(prefix_depth, n) - 1):
+        prefixes = [(path + [j], cost + c) for path, cost in prefixes
+                    for j, c in reversed(children[path[-1]]) if j not in path]
+
+    best = Value('d', inf)
+    nodes = Value('q', 0)
+    deadline = None if time_limit is None else time.time() + time_limit
+    with ProcessPoolExecutor(workers or os.cpu_count(), initializer=init_dfs_worker,
+                             initargs=(children, back, min_out, start_city, best, nodes, deadline, max_nodes)) as pool:
+        results = list(pool.map(dfs_subtree, *zip(*prefixes))) if prefixes else []
+
+    best_path = None
+    min_cost = inf
+    budget = Budget()
+    lower_bound = inf
+    expanded = pruned = 0
+    for path, cost, sub_expanded, sub_pruned, sub_nodes, sub_out, sub_bound in results:
+        expanded += sub_expanded
+        pruned += sub_pruned
+        budget.nodes += sub_nodes
+        budget.out |= sub_out
+        lower_bound = min(lower_bound, sub_bound)
+        if cost < min_cost:
+            best_path, min_cost = path, cost
+    search_stats(stats, budget, min(lower_bound, min_cost), expanded=expanded, pruned=pruned, subtrees=len(prefixes))
+    return best_path, min_cost
+
+
+def tsp_held_karp(map, start_city):
+    n = len(map)
+    if n < 2:
+        return None, float('inf')
+
+    # relabel the other cities 0..m-1, missing roads cost inf
+    others = [c for c in range(n) if c != start_city]
+    m = len(others)
+    w = road_costs(map)
+    w_start = w[start_city, others]   # start -> city
+    w_back = w[others, start_city]    # city -> start
+    w = w[np.ix_(others, others)]
+
+    # dp[mask, j] = cheapest path from start through the cities in mask, ending at j
+    full = (1 << m) - 1
+    dp = np.full((1 << m, m), np.inf)
+    parent = np.full((1 << m, m), -1, dtype=np.int8)
+    for j in range(m):
+        dp[1 << j, j] = w_start[j]
+
+    # group subsets by size so every layer only reads the one before it
+    popcount = np.zeros(1 << m, dtype=np.int8)
+    for b in range(m):
+        popcount[1 << b:2 << b] = popcount[:1 << b] + 1
+    order = np.argsort(popcount, kind='stable')
+    bounds = np.cumsum(np.bincount(popcount, minlength=m + 1))
+
+    for size in range(2, m + 1):
+        layer = order[bounds[size - 1]:bounds[size]]
+        for j in range(m):
+            masks = layer[(layer >> j) & 1 == 1]
+            cand = dp[masks ^ (1 << j)] + w[:, j]
+            best = np.argmin(cand, axis=1)
+            dp[masks, j] = cand[np.arange(len(masks)), best]
+            parent[masks, j] = best
+
+    # close the tour back to start_city
+    total = dp[full] + w_back
+    last = int(np.argmin(total))
+    min_cost = total[last]
+    if not np.isfinite(min_cost):
+        return None, float('inf')
+
+    path = []
+    mask = full
+    while last != -1:
+        path.append(others[last])
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    best_path = [start_city] + path[::-1] + [start_city]
+    return best_path, float(min_cost)
+
+
+def main(num_cities, density, symmetric, debug, seed=0):
+    #load cities and map, generated on first use
     n = num_cities
-    cities = gen_cities(n)
+    cities, map = load_instance(n, density, symmetric, seed)
     if debug:
         [print(c) for c in cities]
-
-    #generate map
-    map = gen_map(cities, n, density, symmetric)
-    if debug:
         print("Map:")
         map_print(n, map)
     
@@ -126,8 +436,24 @@ def main(num_cities, density, symmetric, debug):
     bfs_path, bfs_cost = tsp_bfs(map, start_city)
     print(f"BFS\nCost: {bfs_cost:.4f}\nPath: {bfs_path}\n")
 
+    compact_path, compact_cost = tsp_bfs_compact(map, start_city)
+    print(f"BFS (compact frontier)\nCost: {compact_cost:.4f}\nPath: {compact_path}\n")
+
     dfs_path, dfs_cost = tsp_dfs(map, start_city)
-    print(f"DFS\nCost: {dfs_cost:.4f}\nPath: {dfs_path}")
+    print(f"DFS\nCost: {dfs_cost:.4f}\nPath: {dfs_path}\n")
+
+    bnb_stats = {}
+    bnb_path, bnb_cost = tsp_dfs_bnb(map, start_city, bnb_stats)
+    print(f"DFS branch-and-bound\nCost: {bnb_cost:.4f}\nPath: {bnb_path}\n"
+          f"Expanded: {bnb_stats['expanded']}, pruned: {bnb_stats['pruned']}\n")
+
+    par_stats = {}
+    par_path, par_cost = tsp_dfs_parallel(map, start_city, stats=par_stats)
+    print(f"DFS parallel\nCost: {par_cost:.4f}\nPath: {par_path}\n"
+          f"Subtrees: {par_stats['subtrees']}, expanded: {par_stats['expanded']}, pruned: {par_stats['pruned']}\n")
+
+    hk_path, hk_cost = tsp_held_karp(map, start_city)
+    print(f"Held-Karp\nCost: {hk_cost:.4f}\nPath: {hk_path}")
 
 
 
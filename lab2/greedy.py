@@ -1,132 +1,47 @@
-import random
-import time
-import pandas as pd
-
-class City:
-    def __init__(self, name, x, y ,z):
-        self.name = name
-        self.x = x
-        self.y = y
-        self.z = z
-    def __str__(self):
-        return f"{self.name} ({self.x}, {self.y}, {self.z})"
-    
-
-def gen_coordinates():
-    x = random.uniform(-100, 100)
-    y = random.uniform(-100, 100)
-    z = random.uniform(0, 50)
-
-    return x, y, z
-
-def gen_cities(n):
-    cities = []
-    for i in range(n):
-        x, y, z = gen_coordinates()
-        name = f"city{i}"
-        cities.append(City(name, x, y, z))
-    return cities
-
-def map_print(n, map):
-    df = pd.DataFrame(map)
-        
-    df.index = [f"City {i}" for i in range(n)]
-    df.columns = [f"City {j}" for j in range(n)]
-    
-    pd.set_option('display.precision', 2)
-    pd.set_option('display.float_format', '{:.2f}'.format)
-    
-    print(df)
-
-def euclidean_distance(city1, city2):
-    distance = ((city1.x - city2.x)**2 + (city1.y - city2.y)**2 + (city1.z - city2.z)**2)**0.5
-    return distance
-
-def gen_map(cities, n, density, symmetric):
-    map = [[0 for _ in range(n)] for _ in range(n)]
-    for i in range(n):
-        for j in range(n):
-            if random.random() <= density:
-                if symmetric:
-                    map[i][j] = euclidean_distance(cities[i], cities[j])
-                    map[j][i] = map[i][j]
-                else:
-                    if i != j:
-                        distance = euclidean_distance(cities[i], cities[j])
-                        if cities[i].z < cities[j].z:
-                            distance *= 1.1
-                        elif cities[i].z > cities[j].z:
-                            distance *= 0.9
-                        map[i][j] = distance
-    return map
-
-def tsp_bfs(map, start_city):
-    n = len(map)
-
-    queue = [(start_city, [start_city], 0)]
-
-    best_path = None
-    min_cost = float('inf')
-
-    while queue:
-        city, path, cost = queue.pop(0) # FIFO
-
-        if len(path) == n:
-            if map[city][start_city] > 0:
-                cost += map[city][start_city]
-                if cost < min_cost:
-                    min_cost = cost
-                    best_path = path + [start_city]
-        else:
-            for next_city in range(n):
-                if next_city not in path and map[city][next_city] != 0:
-                    queue.append((next_city, path + [next_city], cost + map[city][next_city]))
-    return best_path, min_cost
-
-def tsp_dfs(map, start_city):
-    n = len(map)
+import numpy as np
 
-    stack = [(start_city, [start_city], 0)] # LIFO
+from tsp_utils import *
 
-    best_path = None
-    min_cost = float('inf')
-
-    while stack:
-        city, path, cost = stack.pop()
-
-        if len(path) == n:
-            if map[city][start_city] > 0:
-                cost += map[city][start_city]
-                if cost < min_cost:
-                    min_cost = cost
-                    best_path = path + [start_city]
-        else:
-            for next_city in range(n-1, -1, -1):
-                if next_city not in path and map[city][next_city] > 0:
-                    stack.append((next_city, path + [next_city], cost + map[city][next_city]))
-    return best_path, min_cost
-
-def tsp_nn(map, start_city):
+def tsp_nn(map, start_city, candidates=None):
+    if isinstance(map, Roads):
+        return tsp_nn_roads(map, start_city)
     n = len(map)
+    dist = np.asarray(map, dtype=float)
     path = [start_city]
     cost = 0
+    visited = np.zeros(n, dtype=bool)
+    visited[start_city] = True
+
+    # k nearest roads per city, nearest first; an int k builds them here,
+    # an array from candidate_lists is reused as is
+    if isinstance(candidates, int):
+        candidates = candidate_lists(dist, candidates)
+    if candidates is not None:
+        candidates = np.asarray(candidates).tolist()
 
     while len(path) < n:
         city = path[-1]
-        min_dist = float('inf')
         next_city = None
 
-        for i in range(n):
-            if i not in path and map[city][i] > 0:
-                if map[city][i] < min_dist:
-                    min_dist = map[city][i]
+        # the first unvisited candidate is the nearest unvisited city
+        if candidates is not None:
+            for i in candidates[city]:
+                if i < 0:
+                    break
+                if not visited[i]:
                     next_city = i
-        
+                    break
+
+        # every candidate is visited, fall back to a full scan
         if next_city is None:
-            return None, -1
-        
+            row = np.where(visited | (dist[city] <= 0), np.inf, dist[city])
+            next_city = int(np.argmin(row))
+            if row[next_city] == np.inf:
+                return None, -1
+
         path.append(next_city)
-        cost += min_dist
+        cost += dist[city, next_city]
+        visited[next_city] = True
 
     if map[path[-1]][start_city] > 0:
         cost += map[path[-1]][start_city]
@@ -134,104 +49,209 @@ def tsp_nn(map, start_city):
         return path, cost
     else:
         return None, -1
-    
+
+def tsp_nn_roads(roads, start_city):
+    # nearest neighbour over a CSR map: the out-roads are sorted cheapest first,
+    # so the first unvisited one is the nearest and no other city is looked at
+    n = len(roads)
+    path = [start_city]
+    cost = 0
+    visited = np.zeros(n, dtype=bool)
+    visited[start_city] = True
+
+    city = start_city
+    while len(path) < n:
+        idx, costs = roads.neighbours(city)
+        free = np.flatnonzero(~visited[idx])
+        if not len(free):
+            return None, -1
+        k = free[0]
+        city = int(idx[k])
+        path.append(city)
+        cost += costs[k]
+        visited[city] = True
+
+    back = roads.cost(city, start_city)
+    if back == np.inf:
+        return None, -1
+    path.append(start_city)
+    return path, cost + back
+
 def tsp_greedy(map, start_city):
     n = len(map)
+    # out-roads per city, cheapest first, so both scans stop at the first unvisited city
+    adj = as_roads(map).rows()
     path = [start_city]
+    visited = [False] * n
+    visited[start_city] = True
     cost = 0
 
     while len(path) < n:
         city = path[-1]
         min_dist = float('inf')
-        next_city = None
-
-        # check all unvisited cities
-        for city1 in range(n):
-            if city1 not in path and map[city][city1] > 0:
-                cost1 = map[city][city1]
-                
-                # if its last city, dont check second city
-                if len(path) == n-1:
-                    if cost1 < min_dist:
-                        min_dist = cost1
-                        best_next_city = city1
-                    continue
-                
-                # check second city
-                min_dist2 = float('inf')
-                for city2 in range(n):
-                    if city2 not in path and city2 != city1 and map[city1][city2] > 0:
-                        cost2 = map[city1][city2]
-                        if cost2 < min_dist2:
-                            min_dist2 = cost2
-
-                # if no path to second city
-                if min_dist2 == float('inf'):
-                    total_cost = cost1
-                else:
-                    total_cost = cost1 + min_dist2
-
-                if total_cost < min_dist:
-                    min_dist = total_cost
-                    best_next_city = city1
+        best_next_city = None
+
+        # check all unvisited cities with a road
+        for city1, cost1 in adj[city]:
+            if visited[city1]:
+                continue
+
+            # cheaper roads come later only with a worse total
+            if cost1 >= min_dist:
+                break
+
+            # if its last city, dont check second city
+            if len(path) == n-1:
+                min_dist = cost1
+                best_next_city, best_cost1 = city1, cost1
+                break
+
+            # check second city, the cheapest unvisited road out of city1
+            min_dist2 = float('inf')
+            for city2, cost2 in adj[city1]:
+                if not visited[city2] and city2 != city1:
+                    min_dist2 = cost2
+                    break
+
+            # if no path to second city
+            if min_dist2 == float('inf'):
+                total_cost = cost1
+            else:
+                total_cost = cost1 + min_dist2
+
+            if total_cost < min_dist:
+                min_dist = total_cost
+                best_next_city, best_cost1 = city1, cost1
 
         # if no path to any city
         if best_next_city is None:
             return None, -1
-        
+
         # add just 1st city to path
         path.append(best_next_city)
-        cost += map[city][best_next_city]
-    
+        visited[best_next_city] = True
+        cost += best_cost1
+
     # check if path is complete
-    if map[path[-1]][start_city] > 0:
-        cost += map[path[-1]][start_city]
+    back = dict(adj[path[-1]]).get(start_city)
+    if back is not None:
+        cost += back
         path.append(start_city)
         return path, cost
     else:
         return None, -1
 
+def find(parent, i):
+    # union-find root with path halving
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def tsp_greedy_edge(map, start_city, candidates=10):
+    # greedy edge matching: take edges cheapest first while no city gets more than
+    # two roads (one in and one out on asymmetric maps) and no early cycle closes;
+    # candidates=k only sorts each city's k nearest roads, None sorts every road
+    w = road_costs(map)
+    n = len(w)
+    if n < 2:
+        return None, -1
+    symmetric = np.array_equal(w, w.T)
 
-def main(num_cities, density, symmetric, debug):
-    #generate cities
-    n = num_cities
-    cities = gen_cities(n)
-    if debug:
-        [print(c) for c in cities]
-
-    #generate map
-    map = gen_map(cities, n, density, symmetric)
-    if debug:
-        print("Map:")
-        map_print(n, map)
-    
+    # candidate edges sorted once by cost
+    if candidates is None:
+        src, dst = np.nonzero(np.isfinite(w))
+    else:
+        near = candidate_lists(w, candidates)
+        src = np.repeat(np.arange(n), near.shape[1])
+        dst = near.ravel()
+        src, dst = src[dst >= 0], dst[dst >= 0]
+    if symmetric:
+        # keep each road once; k-nearest lists are not mutual, so dedupe both directions
+        pairs = np.unique(np.sort(np.stack((src, dst), axis=1), axis=1), axis=0)
+        src, dst = pairs[:, 0], pairs[:, 1]
+    order = np.argsort(w[src, dst], kind='stable')
+    src, dst = src[order].tolist(), dst[order].tolist()
+
+    parent = list(range(n))
+    degree_out = [0] * n
+    degree_in = [0] * n
+    links = [[] for _ in range(n)]
+    accepted = 0
+    for i, j in zip(src, dst):
+        if symmetric:
+            if degree_out[i] + degree_in[i] >= 2 or degree_out[j] + degree_in[j] >= 2:
+                continue
+        elif degree_out[i] or degree_in[j]:
+            continue
+        ri, rj = find(parent, i), find(parent, j)
+        if ri == rj:
+            continue # would close a cycle before every city is on it
+        parent[ri] = rj
+        degree_out[i] += 1
+        degree_in[j] += 1
+        links[i].append(j)
+        if symmetric:
+            links[j].append(i)
+        accepted += 1
+        if accepted == n - 1:
+            break
+
+    # walk the accepted edges into path fragments
+    fragments = []
+    seen = np.zeros(n, dtype=bool)
+    if symmetric:
+        heads = [i for i in range(n) if len(links[i]) < 2]
+    else:
+        heads = [i for i in range(n) if degree_in[i] == 0]
+    for head in heads:
+        if seen[head]:
+            continue
+        fragment, prev, city = [head], -1, head
+        seen[head] = True
+        while True:
+            nxt = [j for j in links[city] if j != prev and not seen[j]]
+            if not nxt:
+                break
+            prev, city = city, nxt[0]
+            fragment.append(city)
+            seen[city] = True
+        fragments.append(fragment)
+
+    # join the fragments nearest end first, starting with the one holding start_city
+    first = next(k for k, f in enumerate(fragments) if start_city in f)
+    tour = fragments.pop(first)
+    while fragments:
+        tail = tour[-1]
+        starts = np.array([f[0] for f in fragments])
+        cost = w[tail, starts]
+        if symmetric:
+            ends = np.array([f[-1] for f in fragments])
+            cost = np.minimum(cost, w[tail, ends])
+        k = int(np.argmin(cost))
+        if cost[k] == np.inf:
+            return None, -1
+        fragment = fragments.pop(k)
+        if symmetric and w[tail, fragment[-1]] < w[tail, fragment[0]]:
+            fragment = fragment[::-1]
+        tour += fragment
+
+    # rotate to start_city and close the tour
+    k = tour.index(start_city)
+    tour = tour[k:] + tour[:k]
+    path = tour + [start_city]
+    cost = w[path[:-1], path[1:]].sum()
+    if cost == np.inf:
+        return None, -1
+    return path, cost
 
-    #TSP
-    start_city = 0 
-
-    start_time = time.time()
-    bfs_path, bfs_cost = tsp_bfs(map, start_city)
-    end_time = time.time()
-    bfs_time = end_time - start_time
-    print(f"BFS\nTime: {bfs_time}\nCost: {bfs_cost:.4f}\nPath: {bfs_path}\n")
-
-    start_time = time.time()
-    dfs_path, dfs_cost = tsp_dfs(map, start_city)
-    end_time = time.time()
-    dfs_time = end_time - start_time
-    print(f"DFS\nTime: {dfs_time}\nCost: {dfs_cost:.4f}\nPath: {dfs_path}")
-
-    start_time = time.time()
-    nn_path, nn_cost = tsp_nn(map, start_city)
-    end_time = time.time()
-    nn_time = end_time - start_time
-    print(f"NN\nTime: {nn_time}\nCost: {nn_cost:.4f}\nPath: {nn_path}")
-
-    start_time = time.time()
-    greedy_path, greedy_cost = tsp_greedy(map, start_city)
-    end_time = time.time()
-    greedy_time = end_time - start_time
-    print(f"Greedy\nTime: {greedy_time}\nCost: {greedy_cost:.4f}\nPath: {greedy_path}")
+
+def main(num_cities, density, symmetric, debug):
+    # imported here because benchmark imports this module
+    from benchmark import lab_main
+    solvers = ['bfs', 'dfs', 'nn', 'greedy',
+               'greedy_edge', 'nn_ls', 'greedy_edge_ls']
+    lab_main(solvers, num_cities, density, symmetric, debug)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+import time
+from collections import deque
+
+import numpy as np
+
+from lab2.greedy import tsp_greedy_edge, tsp_nn
+from lab2.local_search import EPS, Tour, improve_tour, try_or_opt
+from tsp_utils import *
+
+def lk_chain(t, t1, first, neighbours, max_depth):
+    # one variable-depth LK search: break t1 -> t2 = succ(t1), then repeatedly
+    # add t2 -> t3, break t4 -> t3 (t4 = pred(t3)) and reverse t2..t4, which
+    # keeps t2 = succ(t1) as the only open edge. The chain is cut back to the
+    # step with the best closed tour; returns the touched cities or None
+    w = t.w
+    t2 = t.succ(t1)
+    g = w[t1, t2] # gain so far without the closing edge t1 -> t2
+    steps = []
+    added = set()
+    touched = [t1, t2]
+    best_gain, best_steps = EPS, 0
+
+    for depth in range(max_depth):
+        options = [first] if depth == 0 else neighbours[t2]
+        best = None
+        for t3 in options:
+            if t3 < 0:
+                break
+            if t3 == t1 or t3 == t2:
+                continue
+            t4 = t.pred(t3)
+            if t4 == t2 or (t4, t3) in added:
+                continue # never break an edge added by this chain
+            g1 = g - w[t2, t3]
+            if g1 <= EPS:
+                continue
+            i, j = t.pos[t2], t.pos[t4]
+            g1 -= t.reversal_delta(i, j)
+            if g1 <= EPS:
+                continue
+            g2 = g1 + w[t4, t3]
+            if best is None or g2 > best[0]:
+                best = (g2, t3, t4, i, j)
+        if best is None:
+            break
+
+        g, t3, t4, i, j = best
+        t.reverse(i, j, shortest=False)
+        steps.append((i, j))
+        added.add((t2, t3))
+        touched += [t3, t4]
+        t2 = t4
+
+        gain = g - w[t1, t2] # close the tour with t1 -> t2
+        if gain > best_gain:
+            best_gain, best_steps = gain, len(steps)
+
+    # undo the steps after the best closing point
+    for i, j in reversed(steps[best_steps:]):
+        t.reverse(i, j, shortest=False)
+    return touched if best_steps else None
+
+def lk_move(t, t1, neighbours, max_depth=50, breadth=5):
+    # try the `breadth` most promising first steps from t1
+    w = t.w
+    t2 = t.succ(t1)
+    first = []
+    for t3 in neighbours[t2]:
+        if t3 < 0:
+            break
+        if t3 == t1 or t3 == t2 or t.pred(t3) == t2:
+            continue
+        first.append((w[t.pred(t3), t3] - w[t2, t3], t3))
+    first.sort(reverse=True)
+    for _, t3 in first[:breadth]:
+        touched = lk_chain(t, t1, t3, neighbours, max_depth)
+        if touched is not None:
+            return touched
+    return None
+
+def local_optimum(t, queue, neighbours, max_depth, breadth, deadline=None):
+    # LK moves, then Or-opt moves, from every queued city until none improves;
+    # with a deadline no new city is taken from the queue once it has passed
+    queued = np.zeros(t.n, dtype=bool)
+    queued[list(queue)] = True
+    while queue:
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        a = queue.popleft()
+        queued[a] = False
+        changed = lk_move(t, a, neighbours, max_depth, breadth)
+        if changed is None:
+            changed = try_or_opt(t, a, neighbours)
+        if changed is None:
+            continue
+        for city in changed:
+            if not queued[city]:
+                queued[city] = True
+                queue.append(city)
+
+def double_bridge(t, rng, max_segment=50):
+    # swap two short adjacent segments (A B C D -> A C B D); returns the six
+    # cities next to the new edges, or None if no kick without missing roads was found
+    w = t.w
+    n = t.n
+    length = max(1, min(max_segment, (n - 2) // 3))
+    for _ in range(10):
+        r = np.roll(t.tour, -int(rng.integers(n)))
+        a, b = rng.integers(1, length + 1, size=2)
+        seg_b, seg_c, rest = r[:a], r[a:a + b], r[a + b:]
+        new_edges = ((rest[-1], seg_c[0]), (seg_c[-1], seg_b[0]), (seg_b[-1], rest[0]))
+        if all(np.isfinite(w[i, j]) for i, j in new_edges):
+            t.set_tour(np.concatenate((seg_c, seg_b, rest)))
+            return [rest[-1], seg_b[0], seg_b[-1], seg_c[0], seg_c[-1], rest[0]]
+    return None
+
+def tsp_lk(map, start_city, time_limit=1.0, candidates=8, max_kicks=None, rng=None, path=None,
+           max_depth=50, breadth=5):
+    # chained Lin-Kernighan: LK + Or-opt local search from a constructed tour,
+    # then double-bridge kicks until time_limit seconds (or max_kicks) are used up
+    rng = np.random.default_rng(rng)
+    deadline = time.perf_counter() + time_limit
+    if path is None:
+        path, _ = tsp_greedy_edge(map, start_city, candidates)
+        if not path:
+            path, _ = tsp_nn(map, start_city, candidates)
+    if not path:
+        return None, -1
+    w = road_costs(map)
+    n = len(w)
+    if n < 8:
+        return improve_tour(map, path, candidates)
+
+    neighbours = candidate_lists(np.minimum(w, w.T), candidates).tolist()
+    t = Tour(w, path[:-1], np.array_equal(w, w.T))
+    local_optimum(t, deque(range(n)), neighbours, max_depth, breadth, deadline)
+    best_tour, best_cost = t.tour.copy(), t.cost()
+
+    kicks = 0
+    while time.perf_counter() < deadline and (max_kicks is None or kicks < max_kicks):
+        kicks += 1
+        kicked = double_bridge(t, rng)
+        if kicked is None:
+            continue
+        local_optimum(t, deque(kicked), neighbours, max_depth, breadth, deadline)
+        cost = t.cost()
+        if cost < best_cost - EPS:
+            best_tour, best_cost = t.tour.copy(), cost
+        else:
+            t.set_tour(best_tour)
+
+    # rotate back to the start city
+    tour = np.roll(best_tour, -int(np.flatnonzero(best_tour == start_city)[0])).tolist()
+    return tour + [start_city], best_cost
+
+
+def main(num_cities, density, symmetric, debug):
+    # imported here because benchmark imports this module
+    from benchmark import lab_main
+    lab_main(['nn', 'nn_ls', 'lk'], num_cities, density, symmetric, debug)
+
+
+if __name__ == "__main__":
+    n_cities = 2000
+
+    print("\n100% connections, Symmetric")
+    main(num_cities=n_cities, density=1.0, symmetric=True, debug=False)
+
+    # print("\n100% connections, Asymmetric")
+    # main(num_cities=n_cities, density=1.0, symmetric=False, debug=False)
@@ -0,0 +1,213 @@
+from collections import deque
+
+import numpy as np
+
+from tsp_utils import *
+
+EPS = 1e-9
+
+class Tour:
+    # array tour: tour[i] is the i-th city, pos[city] its index
+    def __init__(self, w, path, symmetric):
+        self.w = w
+        self.n = len(w)
+        self.symmetric = symmetric
+        self.tour = np.array(path, dtype=np.intp)
+        self.pos = np.empty(self.n, dtype=np.intp)
+        self.pos[self.tour] = np.arange(self.n)
+        self.prefix = None # forward/backward edge cost prefix sums, asymmetric maps only
+
+    def set_tour(self, tour):
+        self.tour = np.array(tour, dtype=np.intp)
+        self.pos[self.tour] = np.arange(self.n)
+        self.prefix = None
+
+    def succ(self, city):
+        return self.tour[(self.pos[city] + 1) % self.n]
+
+    def pred(self, city):
+        return self.tour[self.pos[city] - 1]
+
+    def cost(self):
+        return self.w[self.tour, np.roll(self.tour, -1)].sum()
+
+    def reversal_delta(self, i, j):
+        # change in cost of the path tour[i..j] (circular) when it is walked backwards
+        if self.symmetric or i == j:
+            return 0.0
+        if self.prefix is None:
+            nxt = np.roll(self.tour, -1)
+            ahead, back = self.w[self.tour, nxt], self.w[nxt, self.tour]
+            missing = ~np.isfinite(back) # roads that only exist one way
+            # an open tour edge (LK chain) is never inside a reversed segment
+            fwd = np.concatenate(([0.0], np.cumsum(np.where(np.isfinite(ahead), ahead, 0.0))))
+            bwd = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, back))))
+            gaps = np.concatenate(([0], np.cumsum(missing)))
+            self.prefix = fwd, bwd, gaps
+        fwd, bwd, gaps = self.prefix
+        if i <= j:
+            if gaps[j] - gaps[i]:
+                return np.inf
+            return (bwd[j] - bwd[i]) - (fwd[j] - fwd[i])
+        if gaps[-1] - gaps[i] + gaps[j]:
+            return np.inf
+        return (bwd[-1] - bwd[i] + bwd[j]) - (fwd[-1] - fwd[i] + fwd[j])
+
+    def reverse(self, i, j, shortest=True):
+        # reverse tour[i..j] (circular); on symmetric maps the shorter side is reversed
+        # unless the caller relies on the tour keeping its direction
+        n = self.n
+        length = (j - i) % n + 1
+        if shortest and self.symmetric and length > n // 2:
+            i, j, length = (j + 1) % n, (i - 1) % n, n - length
+        idx = (i + np.arange(length)) % n
+        self.tour[idx] = self.tour[idx[::-1]]
+        self.pos[self.tour[idx]] = idx
+        self.prefix = None
+
+    def move_segment(self, i, length, after, reverse):
+        # cut tour[i..i+length-1] (circular) and put it back right after city `after`
+        idx = (i + np.arange(length)) % self.n
+        seg = self.tour[idx]
+        if reverse:
+            seg = seg[::-1]
+        rest = np.delete(self.tour, idx)
+        k = int(np.flatnonzero(rest == after)[0]) + 1
+        self.tour = np.concatenate((rest[:k], seg, rest[k:]))
+        self.pos[self.tour] = np.arange(self.n)
+        self.prefix = None
+
+def try_two_opt(t, a, neighbours):
+    # 2-opt moves that add the edge a -> c for a near neighbour c of a;
+    # returns the cities whose edges changed, or None
+    w = t.w
+    for variant in ('succ', 'pred'):
+        if variant == 'succ':
+            b = t.succ(a)
+            removed = w[a, b]
+        else:
+            b = t.pred(a)
+            removed = w[b, a]
+        for c in neighbours[a]:
+            if c < 0:
+                break
+            if w[a, c] >= removed:
+                if t.symmetric:
+                    break # neighbours are sorted by this cost, nothing further can gain
+                continue
+            if variant == 'succ':
+                # ... a b ... c d ...  ->  ... a c ... b d ...
+                d = t.succ(c)
+                if c == b or d == a:
+                    continue
+                i, j = t.pos[b], t.pos[c]
+                delta = w[a, c] + w[b, d] - removed - w[c, d]
+            else:
+                # ... b a ... d c ...  ->  ... b d ... a c ...
+                d = t.pred(c)
+                if c == b or d == a:
+                    continue
+                i, j = t.pos[a], t.pos[d]
+                delta = w[b, d] + w[a, c] - removed - w[d, c]
+            if delta >= -EPS:
+                continue
+            delta += t.reversal_delta(i, j)
+            if delta < -EPS:
+                t.reverse(i, j)
+                return a, b, c, d
+    return None
+
+def try_or_opt(t, s1, neighbours, max_length=3):
+    # move the segment of up to max_length cities starting at s1 between two
+    # consecutive cities next to a near neighbour, forwards or reversed
+    w = t.w
+    n = t.n
+    for length in range(1, max_length + 1):
+        if length >= n - 2:
+            break
+        i = t.pos[s1]
+        idx = (i + np.arange(length)) % n
+        seg = t.tour[idx]
+        s2 = seg[-1]
+        p, q = t.pred(s1), t.succ(s2)
+        removed = w[p, s1] + w[s2, q] - w[p, q]
+        if removed <= EPS:
+            continue
+        inside = set(seg.tolist())
+        rev_internal = t.reversal_delta(i, idx[-1])
+
+        # insertion edges (c, e) around the near neighbours of both segment ends
+        edges = []
+        for x in neighbours[s1]:
+            if x < 0:
+                break
+            edges.append((x, t.succ(x)))
+            edges.append((t.pred(x), x))
+        for y in neighbours[s2]:
+            if y < 0:
+                break
+            edges.append((t.pred(y), y))
+            edges.append((y, t.succ(y)))
+
+        for c, e in edges:
+            if c in inside or e in inside:
+                continue
+            forward = w[c, s1] + w[s2, e] - w[c, e]
+            backward = w[c, s2] + w[s1, e] - w[c, e] + rev_internal
+            if forward - removed < -EPS and forward <= backward:
+                t.move_segment(i, length, c, False)
+                return p, q, c, e, s1, s2
+            if backward - removed < -EPS:
+                t.move_segment(i, length, c, True)
+                return p, q, c, e, s1, s2
+    return None
+
+def improve_tour(map, path, candidates=10, moves=('2opt', 'oropt')):
+    # local search on a closed path [start, ..., start] from any solver until
+    # no 2-opt / Or-opt move improves it; returns (path, cost) like the solvers
+    if not path:
+        return None, -1
+    start_city = path[0]
+    w = road_costs(map)
+    n = len(w)
+    if n < 4:
+        return path, w[path[:-1], path[1:]].sum()
+    symmetric = np.array_equal(w, w.T)
+
+    # near neighbours by the cheaper direction, so both edge directions are considered
+    if isinstance(candidates, int):
+        candidates = candidate_lists(np.minimum(w, w.T), candidates)
+    neighbours = np.asarray(candidates).tolist()
+
+    t = Tour(w, path[:-1], symmetric)
+
+    # don't-look bits: only cities next to a recent change are queued
+    queue = deque(range(n))
+    queued = np.ones(n, dtype=bool)
+    while queue:
+        a = queue.popleft()
+        queued[a] = False
+        changed = None
+        if '2opt' in moves:
+            changed = try_two_opt(t, a, neighbours)
+        if changed is None and 'oropt' in moves:
+            changed = try_or_opt(t, a, neighbours)
+        if changed is None:
+            continue
+        for city in changed:
+            if not queued[city]:
+                queued[city] = True
+                queue.append(city)
+
+    # rotate back to the original start city
+    tour = np.roll(t.tour, -t.pos[start_city]).tolist()
+    cost = t.cost()
+    if cost == np.inf:
+        return None, -1
+    return tour + [start_city], cost
+
+def two_opt(map, path, candidates=10):
+    return improve_tour(map, path, candidates, moves=('2opt',))
+
+def or_opt(map, path, candidates=10):
+    return improve_tour(map, path, candidates, moves=('oropt',))
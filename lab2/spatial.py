@@ -0,0 +1,250 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from tsp_utils import *
+
+# Coordinate-based constructors for inputs too large for a dense map: distances
+# come from edge_costs on demand and roads from has_road / near_roads, so memory
+# stays O(n * k). With density < 1 every road exists with probability density.
+
+def quantize(coords, bits):
+    # map coordinates onto a 2^bits grid, same scale on every axis
+    lo = coords.min(axis=0)
+    span = max(float((coords.max(axis=0) - lo).max()), 1e-12)
+    return ((coords - lo) / span * ((1 << bits) - 1)).astype(np.uint64)
+
+def interleave(axes, bits):
+    # bit-interleave the axes into one key, most significant bits first
+    key = np.zeros(len(axes[0]), dtype=np.uint64)
+    one = np.uint64(1)
+    for b in range(bits - 1, -1, -1):
+        for x in axes:
+            key = (key << one) | ((x >> np.uint64(b)) & one)
+    return key
+
+def morton_keys(coords, bits=16):
+    q = quantize(coords, bits)
+    return interleave([q[:, 0], q[:, 1], q[:, 2]], bits)
+
+def hilbert_keys(coords, bits=16):
+    # Skilling's axes-to-transpose transform, vectorized over all cities
+    q = quantize(coords, bits)
+    x = [q[:, 0].copy(), q[:, 1].copy(), q[:, 2].copy()]
+    m = 1 << (bits - 1)
+
+    # inverse undo
+    bit = m
+    while bit > 1:
+        low = np.uint64(bit - 1)
+        for i in range(3):
+            hit = (x[i] & np.uint64(bit)) != 0
+            if i == 0:
+                x[0] = np.where(hit, x[0] ^ low, x[0])
+                continue
+            t = (x[0] ^ x[i]) & low
+            x[0] = np.where(hit, x[0] ^ low, x[0] ^ t)
+            x[i] = np.where(hit, x[i], x[i] ^ t)
+        bit >>= 1
+
+    # gray encode
+    x[1] ^= x[0]
+    x[2] ^= x[1]
+    t = np.zeros_like(x[0])
+    bit = m
+    while bit > 1:
+        t ^= np.where((x[2] & np.uint64(bit)) != 0, np.uint64(bit - 1), np.uint64(0))
+        bit >>= 1
+    for i in range(3):
+        x[i] ^= t
+    return interleave(x, bits)
+
+def curve_order(cities, curve='hilbert'):
+    coords = city_coords(cities)
+    keys = hilbert_keys(coords) if curve == 'hilbert' else morton_keys(coords)
+    return np.argsort(keys, kind='stable')
+
+def insertion_point(cities, path, x, density=1.0, symmetric=True, seed=0):
+    # cheapest q with roads path[q-1] -> x -> path[q], or -1; used when a greedy
+    # walk gets stuck with no road to any city it has not visited yet
+    path = np.asarray(path)
+    a, b = path[:-1], path[1:]
+    ok = has_road(a, x, density, symmetric, seed) & has_road(x, b, density, symmetric, seed)
+    if not ok.any():
+        return -1
+    coords = city_coords(cities)
+    extra = edge_costs(coords, a, x, symmetric) + edge_costs(coords, x, b, symmetric) - edge_costs(coords, a, b, symmetric)
+    return int(np.argmin(np.where(ok, extra, np.inf))) + 1
+
+def close_tour(cities, tour, density=1.0, symmetric=True, seed=0, window=32):
+    # closed path from an open tour starting at the start city; when the last city
+    # has no road back, the tail tour[o+1:] is reversed for the latest o that
+    # gives roads tour[o] -> tour[-1] and tour[o+1] -> start, or else the last
+    # city is moved inside the tour; None if nothing works within window tries
+    tour = np.asarray(tour)
+    start_city = tour[0]
+    n = len(tour)
+    for _ in range(window):
+        if has_road(tour[-1], start_city, density, symmetric, seed):
+            return tour.tolist() + [start_city]
+        for o in range(n - 3, max(n - 3 - window, 0), -1):
+            tail = tour[o + 1:]
+            if not (has_road(tour[o], tail[-1], density, symmetric, seed)
+                    and has_road(tail[0], start_city, density, symmetric, seed)):
+                continue
+            if symmetric or has_road(tail[1:], tail[:-1], density, symmetric, seed).all():
+                return tour[:o + 1].tolist() + tail[::-1].tolist() + [start_city]
+        x = tour[-1]
+        q = insertion_point(cities, tour[:-1], x, density, symmetric, seed)
+        if q < 0:
+            return None
+        tour = np.concatenate((tour[:q], [x], tour[q:-1]))
+    return None
+
+def tour_cost(cities, path, symmetric=True):
+    path = np.asarray(path)
+    return edge_costs(cities, path[:-1], path[1:], symmetric).sum()
+
+def tsp_space_filling(cities, start_city, curve='hilbert', density=1.0, symmetric=True, seed=0, window=8):
+    # visit the cities in Hilbert (or Morton) curve order; on sparse road networks
+    # a missing road is skipped by taking the first city with a road among the
+    # next `window` cities on the curve
+    coords = city_coords(cities)
+    n = len(coords)
+    order = curve_order(coords, curve)
+    k = int(np.flatnonzero(order == start_city)[0])
+    rest = np.roll(order, -k)
+
+    # ok[p]: road rest[p] -> rest[p + 1], kept up to date as cities are swapped
+    ok = has_road(rest[:-1], rest[1:], density, symmetric, seed)
+    for p in range(1, n):
+        if ok[p - 1]:
+            continue
+        # widen the look-ahead until some city further on has a road
+        size = window
+        while True:
+            ahead = rest[p:p + size]
+            found = np.flatnonzero(has_road(rest[p - 1], ahead, density, symmetric, seed))
+            if len(found) or p + size >= n:
+                break
+            size *= 4
+        if not len(found):
+            # nothing left has a road from here: slot rest[p] in between earlier cities
+            x = rest[p]
+            q = insertion_point(coords, rest[:p], x, density, symmetric, seed)
+            if q < 0:
+                return None, -1
+            rest[q + 1:p + 1] = rest[q:p].copy()
+            rest[q] = x
+            hi = min(p + 1, n - 1)
+            ok[q - 1:hi] = has_road(rest[q - 1:hi], rest[q:hi + 1], density, symmetric, seed)
+            continue
+        o = p + int(found[0])
+        rest[p], rest[o] = rest[o], rest[p]
+        for q in {p - 1, p, o - 1, o}:
+            if 0 <= q < n - 1:
+                ok[q] = has_road(rest[q], rest[q + 1], density, symmetric, seed)
+
+    path = close_tour(coords, rest, density, symmetric, seed)
+    if path is None:
+        return None, -1
+    return path, tour_cost(coords, path, symmetric)
+
+def near_roads(cities, k, density=1.0, symmetric=True, seed=0):
+    # CSR roads from every city to those of its k nearest cities that have one,
+    # found with a KD-tree so no n x n structure is built
+    coords = city_coords(cities)
+    n = len(coords)
+    k = min(k, n - 1)
+    _, near = cKDTree(coords).query(coords, k=k + 1)
+    src = np.repeat(np.arange(n), k)
+    dst = near[:, 1:].ravel()
+    keep = has_road(src, dst, density, symmetric, seed)
+    src, dst = src[keep], dst[keep]
+    return Roads.from_edges(n, src, dst, edge_costs(coords, src, dst, symmetric))
+
+def tsp_nn_spatial(cities, start_city, density=1.0, symmetric=True, seed=0, k=8):
+    # nearest neighbour tour: first over the precomputed roads to the k nearest
+    # cities, then over KD-tree queries that widen until an unvisited city with a
+    # road turns up; the tree is rebuilt over the unvisited cities once half of it is used
+    coords = city_coords(cities)
+    n = len(coords)
+    roads = near_roads(coords, k, density, symmetric, seed)
+    visited = np.zeros(n, dtype=bool)
+    visited[start_city] = True
+    path = [start_city]
+
+    alive = np.flatnonzero(~visited) # cities in the tree
+    tree = cKDTree(coords[alive])
+    used = 0 # cities in the tree that are visited
+
+    city = start_city
+    while len(path) < n:
+        near, _ = roads.neighbours(city)
+        free = near[~visited[near]]
+        nxt = int(free[0]) if len(free) else None
+        q = min(4 * k, len(alive))
+        while nxt is None:
+            _, idx = tree.query(coords[city], k=q)
+            cand = alive[np.atleast_1d(idx)]
+            cand = cand[~visited[cand]]
+            reach = cand[has_road(city, cand, density, symmetric, seed)]
+            if len(reach):
+                nxt = int(reach[np.argmin(edge_costs(coords, city, reach, symmetric))])
+            elif q < len(alive):
+                q = min(4 * q, len(alive))
+            else:
+                break
+
+        if nxt is None:
+            # no road to any unvisited city: slot the nearest one in between visited ones
+            nxt = int(cand[0])
+            at = insertion_point(coords, path, nxt, density, symmetric, seed)
+            if at < 0:
+                return None, -1
+            path.insert(at, nxt)
+        else:
+            path.append(nxt)
+            city = nxt
+        visited[nxt] = True
+        used += 1
+        if used * 2 > len(alive) and len(path) < n:
+            alive = np.flatnonzero(~visited)
+            tree = cKDTree(coords[alive])
+            used = 0
+
+    path = close_tour(coords, path, density, symmetric, seed)
+    if path is None:
+        return None, -1
+    return path, tour_cost(coords, path, symmetric)
+
+
+def main(num_cities, density, symmetric, debug, seed=0):
+    # imported here like the other labs; these solvers take coordinates, not a map,
+    # so they are timed with the harness's measure() on the cities directly
+    from benchmark import measure
+    cities = gen_cities(num_cities, seed)
+    if debug:
+        [print(c) for c in cities]
+
+    start_city = 0
+    solvers = {
+        'sfc_hilbert': lambda cities, start_city, rng, stats:
+            tsp_space_filling(cities, start_city, 'hilbert', density, symmetric, seed),
+        'sfc_morton': lambda cities, start_city, rng, stats:
+            tsp_space_filling(cities, start_city, 'morton', density, symmetric, seed),
+        'nn_kdtree': lambda cities, start_city, rng, stats:
+            tsp_nn_spatial(cities, start_city, density, symmetric, seed),
+    }
+    for name, solver in solvers.items():
+        path, cost, times, _, _ = measure(solver, cities, start_city, seed, repeats=1, memory=False)
+        print(f"{name:>16}: {min(times):.4f}s cost={cost:.4f}")
+
+
+if __name__ == "__main__":
+    n_cities = 1_000_000
+
+    print("\n100% connections, Symmetric")
+    main(num_cities=n_cities, density=1.0, symmetric=True, debug=False)
+
+    # print("\n80% connections, Asymmetric")
+    # main(num_cities=n_cities, density=0.8, symmetric=False, debug=False)
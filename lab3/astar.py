@@ -1,11 +1,15 @@
-import time
+import heapq
+import itertools
+
+import numpy as np
 
-from lab1.route_search import tsp_bfs, tsp_dfs
-from lab2.greedy import tsp_nn, tsp_greedy
 from tsp_utils import *
 
    
 def min_path(map):
+    # cheapest road in the map, inf if there is none
+    if isinstance(map, Roads):
+        return map.costs.min(initial=np.inf)
     n = len(map)
     h = float('inf')
     for i in range(n):
@@ -24,105 +28,232 @@ def avg_edge(map):
                 count += 1
     return (total / count)
 
+def mst_cost(w, nodes):
+    # Prim's algorithm over an undirected cost matrix restricted to nodes
+    if len(nodes) < 2:
+        return 0.0
+    sub = w[np.ix_(nodes, nodes)]
+    k = len(nodes)
+    in_tree = np.zeros(k, dtype=bool)
+    in_tree[0] = True
+    dist = sub[0].copy()
+    total = 0.0
+    for _ in range(k - 1):
+        dist[in_tree] = np.inf
+        j = int(np.argmin(dist))
+        if dist[j] == np.inf:
+            return np.inf # unvisited cities are not connected
+        total += dist[j]
+        in_tree[j] = True
+        dist = np.minimum(dist, sub[j])
+    return total
+
+def one_tree_penalties(w, iterations=100):
+    # Held-Karp subgradient ascent on the symmetrized map, returns node penalties pi
+    n = len(w)
+    pi = np.zeros(n)
+    if n < 3:
+        return pi
+    best_pi, best_bound = pi.copy(), -np.inf
+    step = 0.01 * np.mean(w[np.isfinite(w)])
+    for _ in range(iterations):
+        wp = w + pi[:, None] + pi[None, :]
+
+        # 1-tree: MST over cities 1..n-1 plus the two cheapest edges of city 0
+        sub = wp[1:, 1:]
+        degree = np.zeros(n, dtype=int)
+        in_tree = np.zeros(n - 1, dtype=bool)
+        in_tree[0] = True
+        dist, link = sub[0].copy(), np.zeros(n - 1, dtype=int)
+        total = 0.0
+        for _ in range(n - 2):
+            dist[in_tree] = np.inf
+            j = int(np.argmin(dist))
+            if dist[j] == np.inf:
+                return best_pi if best_bound > -np.inf else pi
+            total += dist[j]
+            degree[j + 1] += 1
+            degree[link[j] + 1] += 1
+            in_tree[j] = True
+            closer = sub[j] < dist
+            dist[closer], link[closer] = sub[j][closer], j
+        two = np.argsort(wp[0, 1:])[:2] + 1
+        if not np.all(np.isfinite(wp[0, two])):
+            break
+        total += wp[0, two].sum()
+        degree[0] = 2
+        degree[two] += 1
+
+        bound = total - 2 * pi.sum()
+        if bound > best_bound:
+            best_pi, best_bound = pi.copy(), bound
+        if np.all(degree == 2):
+            break # the 1-tree is a tour, the bound is tight
+        pi = pi + step * (degree - 2)
+        step *= 0.95
+    return best_pi
+
+# Every heuristic is built once per map and returns h(city, mask): a lower bound
+# on the cost of going from city through every city not in mask and back to start.
+
+def min_edge_heuristic(map, start_city):
+    # smallest edge in graph times the number of edges left
+    n = len(map)
+    h_cost = min_path(map)
+    def h(city, mask):
+        return h_cost * (n - mask.bit_count() + 1)
+    return h
+
+def min_in_out_heuristic(map, start_city):
+    # every city left has to be exited once and entered once
+    n = len(map)
+    w = road_costs(map)
+    min_out, min_in = w.min(axis=1), w.min(axis=0)
+    memo = {}
+    def h(city, mask):
+        if mask not in memo:
+            unvisited = [j for j in range(n) if not mask & (1 << j)]
+            memo[mask] = (min_out[unvisited].sum(), min_in[unvisited].sum() + min_in[start_city])
+        out_rest, in_rest = memo[mask]
+        return max(out_rest + min_out[city], in_rest)
+    return h
+
+def mst_heuristic(map, start_city, pi=None):
+    # MST over the unvisited cities plus the cheapest edges linking it to city and start,
+    # optionally on costs shifted by 1-tree penalties pi
+    n = len(map)
+    w = road_costs(map)
+    if pi is None:
+        pi = np.zeros(n)
+    sym = np.minimum(w, w.T) + pi[:, None] + pi[None, :]
+    w = w + pi[:, None] + pi[None, :]
+    memo = {}
+    def h(city, mask):
+        unvisited = [j for j in range(n) if not mask & (1 << j)]
+        if not unvisited:
+            return w[city, start_city] - pi[city] - pi[start_city]
+        if mask not in memo:
+            # the MST part only depends on the visited set
+            memo[mask] = (mst_cost(sym, unvisited) + w[unvisited, start_city].min()
+                          - 2 * pi[unvisited].sum() - pi[start_city])
+        return memo[mask] + w[city, unvisited].min() - pi[city]
+    return h
+
+def one_tree_heuristic(map, start_city):
+    # MST bound tightened by Held-Karp 1-tree penalties computed once per map
+    w = road_costs(map)
+    return mst_heuristic(map, start_city, one_tree_penalties(np.minimum(w, w.T)))
+
+HEURISTICS = {
+    'min_edge': min_edge_heuristic,
+    'min_in_out': min_in_out_heuristic,
+    'mst': mst_heuristic,
+    'one_tree': one_tree_heuristic,
+}
+
 class Node:
-    def __init__(self, parent, city, g, path):
+    def __init__(self, parent, city, g, mask, depth):
         self.parent = parent
         self.city = city
         self.g = g         # cost from start
         self.h = 0         # heuristic cost
         self.f = 0         # total cost = g + h
-        self.path = path   # visited sequence of cities
+        self.mask = mask   # bitmask of visited cities
+        self.depth = depth # number of cities on the path
 
-    def __eq__(self, other):
-        return self.path == other.path
-    
+    def path(self):
+        # walk the parent links back to the start city
+        path = []
+        node = self
+        while node is not None:
+            path.append(node.city)
+            node = node.parent
+        return path[::-1]
 
-def astar(map, start_city):
+
+def astar(map, start_city, heuristic='min_edge', stats=None, time_limit=None, max_nodes=None):
     n = len(map)
-    h_cost = min_path(map) # smallest edge in graph
-    start = Node(None, start_city, 0, [start_city])
-    open, closed = [start], []
+    h = HEURISTICS[heuristic](map, start_city)
+    roads = as_roads(map)
+    adj = roads.rows()
+    back = [roads.cost(i, start_city) for i in range(n)]
+    full = (1 << n) - 1
+
+    start = Node(None, start_city, 0, 1 << start_city, 1)
+    start.h = start.f = h(start_city, start.mask)
+    tie = itertools.count()
+    open = [(start.f, -start.depth, next(tie), start)]
+    best_g = {(start_city, start.mask): 0} # best g seen per (city, visited set)
+
+    budget = Budget(time_limit, max_nodes)
+    incumbent = None # cheapest closed tour pushed so far, returned if the budget runs out
+    expanded = generated = 0
 
-    
     while open:
-        current = min(open, key=lambda node: node.f) # node with lowest f
-        open.remove(current)
-        closed.append(current)
-        
-        # goal: visited all cities and can return to start
-        if len(current.path) == n and map[current.city][start_city] > 0:
-            final_cost = current.g + map[current.city][start_city]
-            return current.path + [start_city], final_cost
-
-        for child in range(n):
-            
-            # skip if no path or already visited
-            if map[current.city][child] == 0 or child in current.path:
+        if budget.spent():
+            break
+        _, _, _, current = heapq.heappop(open) # node with lowest f
+
+        # goal: the tour has already been closed back to start_city
+        if current.mask == full and current.city == start_city and current.depth > 1:
+            search_stats(stats, budget, current.g, expanded=expanded, generated=generated)
+            return current.path(), current.g
+
+        # skip stale entries that were improved after being pushed
+        if current.g > best_g.get((current.city, current.mask), float('inf')):
+            continue
+        expanded += 1
+
+        if current.mask == full:
+            # all cities visited, the only move left is back to the start
+            if back[current.city] < float('inf'):
+                g2 = current.g + back[current.city]
+                goal = Node(current, start_city, g2, full, current.depth + 1)
+                goal.f = g2
+                heapq.heappush(open, (goal.f, -goal.depth, next(tie), goal))
+                if incumbent is None or g2 < incumbent.g:
+                    incumbent = goal
+            continue
+
+        for child, road in adj[current.city]:
+
+            # skip if already visited
+            if current.mask & (1 << child):
                 continue
-            
-            g2 = current.g + map[current.city][child]
-            h2 = h_cost * (n - len(current.path))   # admissible heuristic
-            f2 = g2 + h2
-            path2 = current.path + [child]
-            child = Node(current, child, g2, path2)
-            child.h, child.f = h2, f2
-
-            # skip if a better or equal path already seen
-            better_f = lambda lst: any(node.path == child.path and node.f <= child.f for node in lst)
-            if better_f(open) or better_f(closed):
+
+            g2 = current.g + road
+            mask2 = current.mask | (1 << child)
+
+            # skip if a better or equal path to the same state already seen
+            key = (child, mask2)
+            if g2 >= best_g.get(key, float('inf')):
                 continue
+            best_g[key] = g2
 
-            open.append(child)
+            h2 = h(child, mask2)   # admissible heuristic
+            if h2 == float('inf'):
+                continue # the remaining cities cannot be toured from here
+            node = Node(current, child, g2, mask2, current.depth + 1)
+            node.h, node.f = h2, g2 + h2
+            heapq.heappush(open, (node.f, -node.depth, next(tie), node))
+            generated += 1
 
-    return None, -1
+    # out of budget: the lowest f still open bounds the optimum from below
+    lower_bound = float(open[0][0]) if open else float('inf')
+    if incumbent is not None:
+        lower_bound = min(lower_bound, incumbent.g)
+    search_stats(stats, budget, lower_bound, expanded=expanded, generated=generated)
+    if incumbent is None:
+        return None, -1
+    return incumbent.path(), incumbent.g
 
 
 def main(num_cities, density, symmetric, debug):
-    #generate cities
-    n = num_cities
-    cities = gen_cities(n)
-    if debug:
-        [print(c) for c in cities]
-
-    #generate map
-    map = gen_map(cities, n, density, symmetric)
-    if debug:
-        print("Map:")
-        map_print(n, map)
-    
-
-    #TSP
-    start_city = 0 
-
-    start_time = time.time()
-    path, cost = astar(map, start_city)
-    end_time = time.time()
-    astar_time = end_time - start_time
-    print(f"A*\nTime: {astar_time}\nCost: {cost:.4f}\nPath: {path}\n")
-
-    start_time = time.time()
-    bfs_path, bfs_cost = tsp_bfs(map, start_city)
-    end_time = time.time()
-    bfs_time = end_time - start_time
-    print(f"BFS\nTime: {bfs_time}\nCost: {bfs_cost:.4f}\nPath: {bfs_path}\n")
-
-    start_time = time.time()
-    dfs_path, dfs_cost = tsp_dfs(map, start_city)
-    end_time = time.time()
-    dfs_time = end_time - start_time
-    print(f"DFS\nTime: {dfs_time}\nCost: {dfs_cost:.4f}\nPath: {dfs_path}")
-
-    start_time = time.time()
-    nn_path, nn_cost = tsp_nn(map, start_city)
-    end_time = time.time()
-    nn_time = end_time - start_time
-    print(f"NN\nTime: {nn_time}\nCost: {nn_cost:.4f}\nPath: {nn_path}")
-
-    start_time = time.time()
-    greedy_path, greedy_cost = tsp_greedy(map, start_city)
-    end_time = time.time()
-    greedy_time = end_time - start_time
-    print(f"Greedy\nTime: {greedy_time}\nCost: {greedy_cost:.4f}\nPath: {greedy_path}")
+    # imported here because benchmark imports this module
+    from benchmark import lab_main
+    solvers = ['astar_min_edge', 'astar_min_in_out', 'astar_mst', 'astar_one_tree',
+               'bfs', 'dfs', 'nn', 'greedy']
+    lab_main(solvers, num_cities, density, symmetric, debug)
 
 
 if __name__ == "__main__":
@@ -1,135 +1,402 @@
-import time
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
 import numpy as np
 
-from lab1.route_search import tsp_bfs, tsp_dfs
-from lab2.greedy import tsp_nn, tsp_greedy
+from lab2.greedy import tsp_nn
 from tsp_utils import *
-from lab3.astar import *
 
-def aco(map, start_city, n_ants, n_iterations, alpha, beta, evaporation, Q):
+class Strategy:
+    # colony update rule and its settings:
+    #   'as'   - Ant System, every completed ant deposits pheromone
+    #   'mmas' - Max-Min Ant System, only the iteration-best or best-so-far ('elite') tour
+    #            deposits and pheromone is kept in [tau_min, tau_max]
+    #   'acs'  - Ant Colony System, pseudo-random proportional rule (q0), local update (xi)
+    #            and best-so-far global update
+    def __init__(self, name='as', q0=0.9, xi=0.1, elite='iteration', p_best=0.05):
+        if name not in ('as', 'mmas', 'acs'):
+            raise ValueError(f"Unknown strategy: {name}")
+        self.name = name
+        self.q0 = q0 if name == 'acs' else 0.0
+        self.xi = xi
+        self.elite = elite
+        self.p_best = p_best
+        self.tau0 = None # set from the map by initial_pheromone
+
+def roulette(probs, rng, q0=0.0):
+    # pick one column per row with probability proportional to its weight,
+    # ok is False for rows without any positive weight
+    cum = np.cumsum(probs, axis=1)
+    total = cum[:, -1]
+    r = rng.random(len(probs)) * total
+    idx = (cum <= r[:, None]).sum(axis=1) # first column whose cumulative weight passes r
+    last = probs.shape[1] - 1 - np.argmax(probs[:, ::-1] > 0, axis=1)
+    idx = np.minimum(idx, last)
+
+    # pseudo-random proportional rule: with probability q0 take the best column
+    if q0 > 0:
+        exploit = rng.random(len(probs)) < q0
+        idx = np.where(exploit, np.argmax(probs, axis=1), idx)
+    return idx, total > 0
+
+def prepare_candidates(dist, start_city, candidates):
+    # optional k nearest candidate cities per city, an int k or a candidate_lists array;
+    # missing candidates point at start_city, which is always visited
+    if isinstance(candidates, int):
+        candidates = candidate_lists(dist, candidates)
+    if candidates is not None:
+        candidates = np.where(candidates >= 0, candidates, start_city)
+    return candidates
+
+def heuristic_weights(dist, beta):
+    # η (ij) ^ β only depends on the map
+    roads = dist > 0
+    eta_beta = np.zeros(dist.shape)
+    eta_beta[roads] = dist[roads] ** -beta
+    return eta_beta
+
+def initial_pheromone(dist, start_city, strategy, evaporation, Q):
+    # AS starts from 1 everywhere; MMAS from tau_max and ACS from tau0,
+    # both estimated from a nearest neighbour tour
+    n = len(dist)
+    if strategy.name == 'as':
+        return np.ones((n, n))
+    _, length = tsp_nn(dist, start_city, candidates=10)
+    if length == -1:
+        length = n * dist[dist > 0].mean()
+    if strategy.name == 'mmas':
+        return np.full((n, n), Q / (evaporation * length))
+    strategy.tau0 = 1 / (n * length)
+    return np.full((n, n), strategy.tau0)
+
+def build_tours(dist, eta_beta, pheromone, start_city, n_ants, alpha, rng, candidates=None, q0=0.0, local=None):
+    # all ants build their paths together, one step at a time;
+    # returns the tours and their lengths, inf for ants that got lost.
+    # local=(xi, tau0) applies the ACS local pheromone update to every edge as it is used
+    n = len(dist)
+    ants = np.arange(n_ants)
+
+    # τ (ij) ^ α / η (ij) ^ β for every edge (or candidate edge)
+    rows = np.arange(n)[:, None]
+    if candidates is None:
+        weights = pheromone ** alpha * eta_beta
+    else:
+        weights = pheromone[rows, candidates] ** alpha * eta_beta[rows, candidates]
+
+    tours = np.empty((n_ants, n + 1), dtype=np.intp)
+    tours[:, 0] = start_city
+    unvisited = np.ones((n_ants, n), dtype=bool) # tracks unvisited cities
+    unvisited[:, start_city] = False
+    alive = np.ones(n_ants, dtype=bool)
+    lengths = np.zeros(n_ants)
+    current = tours[:, 0].copy()
+
+    for step in range(1, n):
+        if candidates is None:
+            nxt, ok = roulette(weights[current] * unvisited, rng, q0)
+        else:
+            options = candidates[current]
+            pick, ok = roulette(weights[current] * unvisited[ants[:, None], options], rng, q0)
+            nxt = options[ants, pick]
+
+            # every candidate is visited, fall back to a full scan for those ants
+            full = np.flatnonzero(alive & ~ok)
+            if len(full):
+                rows_full = current[full]
+                probs = pheromone[rows_full] ** alpha * eta_beta[rows_full] * unvisited[full]
+                nxt[full], ok[full] = roulette(probs, rng, q0)
+
+        alive &= ok # no unvisited cities reachable, the ant is lost
+        nxt = np.where(alive, nxt, current)
+
+        # ACS local update: make used edges less attractive to the ants behind
+        if local is not None:
+            xi, tau0 = local
+            # an edge taken by k ants in this step gets the update k times, as in local_update
+            edge, uses = np.unique(current[alive] * n + nxt[alive], return_counts=True)
+            i, j = np.divmod(edge, n)
+            pheromone[i, j] = tau0 + (pheromone[i, j] - tau0) * (1 - xi) ** uses
+            if candidates is None:
+                weights[i, j] = pheromone[i, j] ** alpha * eta_beta[i, j]
+            else:
+                weights[i] = pheromone[i[:, None], candidates[i]] ** alpha * eta_beta[i[:, None], candidates[i]]
+
+        tours[:, step] = nxt
+        lengths += np.where(alive, dist[current, nxt], 0)
+        unvisited[ants, nxt] = False
+        current = nxt
+
+    # close the tour back to start_city if possible
+    tours[:, n] = start_city
+    alive &= dist[current, start_city] > 0
+    lengths += dist[current, start_city]
+    lengths[~alive] = np.inf
+    return tours, lengths
+
+def deposit(pheromone, tours, lengths, evaporation, Q):
+    # evaporate
+    pheromone *= (1 - evaporation)
+
+    # deposit new pheromone on each full cycle in one scatter-add,
+    # shorter path = more pheromone
+    done = np.isfinite(lengths)
+    if not done.any():
+        return
+    tours = tours[done]
+    delta = np.repeat(Q / lengths[done], tours.shape[1] - 1)
+    np.add.at(pheromone, (tours[:, :-1].ravel(), tours[:, 1:].ravel()), delta)
+
+def local_update(pheromone, tours, xi, tau0):
+    # the ACS local update of build_tours for every edge the tours used before closing,
+    # applied once per use: an edge used k times moves (1 - (1 - xi)^k) of the way to tau0
+    uses = np.zeros(pheromone.shape)
+    np.add.at(uses, (tours[:, :-2].ravel(), tours[:, 1:-1].ravel()), 1)
+    used = uses > 0
+    pheromone[used] = tau0 + (pheromone[used] - tau0) * (1 - xi) ** uses[used]
+
+def update_pheromone(pheromone, tours, lengths, best_path, best_cost, strategy, evaporation, Q):
+    # global pheromone update after an iteration, according to the strategy
+    if strategy.name == 'as':
+        deposit(pheromone, tours, lengths, evaporation, Q)
+        return
+    if not best_path:
+        pheromone *= (1 - evaporation)
+        return
+
+    if strategy.name == 'acs':
+        # only the best-so-far tour evaporates and deposits
+        path = np.asarray(best_path)
+        i, j = path[:-1], path[1:]
+        pheromone[i, j] = (1 - evaporation) * pheromone[i, j] + evaporation * Q / best_cost
+        return
+
+    # MMAS: a single elite tour deposits, then trails are clamped to [tau_min, tau_max]
+    pheromone *= (1 - evaporation)
+    path, cost = best_path, best_cost
+    if strategy.elite == 'iteration':
+        best = int(np.argmin(lengths))
+        if np.isfinite(lengths[best]):
+            path, cost = tours[best], lengths[best]
+    path = np.asarray(path)
+    pheromone[path[:-1], path[1:]] += Q / cost
+
+    n = len(pheromone)
+    tau_max = Q / (evaporation * best_cost)
+    p = strategy.p_best ** (1 / n)
+    tau_min = tau_max * (1 - p) / (max(n / 2 - 1, 1) * p)
+    np.clip(pheromone, tau_min, tau_max, out=pheromone)
+
+def branching_factor(pheromone, roads, lam=0.05):
+    # average number of roads per city whose pheromone is above
+    # tau_min + lam * (tau_max - tau_min) of that city; near 1-2 means the colony has converged
+    has_roads = roads.any(axis=1)
+    if not has_roads.any():
+        return 0.0
+    roads, pheromone = roads[has_roads], pheromone[has_roads]
+    low = np.where(roads, pheromone, np.inf).min(axis=1)
+    high = np.where(roads, pheromone, -np.inf).max(axis=1)
+    cut = low + lam * (high - low)
+    return float(np.sum(roads & (pheromone >= cut[:, None]), axis=1).mean())
+
+def run_colony(dist, eta_beta, pheromone, start_city, n_ants, n_iterations, alpha, evaporation, Q, rng,
+               candidates=None, strategy=None, patience=None, stats=None):
+    # colony iterations on a pheromone matrix that is updated in place;
+    # with patience set, stop once neither the best cost nor the branching
+    # factor has improved for that many iterations
+    strategy = strategy or Strategy()
+    local = (strategy.xi, strategy.tau0) if strategy.name == 'acs' else None
+    roads = eta_beta > 0
     best_path = []
     total_cost = np.inf
-    n = len(map)
-    pheromone = np.ones((n, n)) # pheromone trails between every city pair
+    best_branching = np.inf
+    stale = 0
+    iterations = 0
 
     for _ in range(n_iterations):
-        all_paths = []
-        all_lengths = []
-
-        # each ant builds a path
-        for _ in range(n_ants):
-            visited = [False] * n # tracks visited cities
-            current = start_city
-            visited[current] = True
-            path = [current]
-            length = 0
-
-            # visit all other cities
-            while not all(visited):
-                unv = [j for j in range(n) if not visited[j] and map[current][j] > 0] # indices of unvisited cities
-                if not unv:
-                    length = np.inf # no unvisited cities left, break the loop
-                    break
-                probs = np.array([
-                    pheromone[current, j]**alpha / (map[current][j]**beta) # τ (ij) ^ α / η (ij) ^ β
-                    for j in unv
-                ])
-                probs /= probs.sum() # normalize to sum to 1
-                nxt = np.random.choice(unv, p=probs) # select next city based on probabilities
-
-                path.append(nxt)
-                length += map[current][nxt]
-                visited[nxt] = True
-                current = nxt
-
-            # close the tour back to start_city if possible
-            if length != np.inf and map[current][start_city] > 0:
-                length += map[current][start_city]
-                path.append(start_city)
-
-                all_paths.append(path)
-                all_lengths.append(length)
-
-                # update global best
-                if length < total_cost:
-                    best_path = path.copy()
-                    total_cost = length
-
-        # evaporate
-        pheromone *= (1 - evaporation)
+        tours, lengths = build_tours(dist, eta_beta, pheromone, start_city, n_ants, alpha, rng, candidates,
+                                     strategy.q0, local)
+        iterations += 1
+
+        # update global best
+        improved = False
+        best = int(np.argmin(lengths))
+        if lengths[best] < total_cost:
+            best_path = tours[best].tolist()
+            total_cost = lengths[best]
+            improved = True
 
-        # deposit new pheromone on each full cycle
-        for path, length in zip(all_paths, all_lengths):
-            delta = Q / length  # how much pheromone is deposited on each edge of that path
-                                # shorter path = more pheromone
-            for i in range(len(path) - 1):
-                pheromone[path[i], path[i+1]] += delta # add pheromone to the edge
+        update_pheromone(pheromone, tours, lengths, best_path, total_cost, strategy, evaporation, Q)
 
+        # stagnation detection
+        if patience is not None:
+            branching = branching_factor(pheromone, roads)
+            if branching < best_branching - 1e-9:
+                best_branching = branching
+                improved = True
+            stale = 0 if improved else stale + 1
+            if stale >= patience:
+                break
+
+    if stats is not None:
+        stats['iterations'] = iterations
+        if patience is not None:
+            stats['branching'] = best_branching
+    return best_path, total_cost
+
+def aco(map, start_city, n_ants, n_iterations, alpha, beta, evaporation, Q, rng=None, candidates=None,
+        strategy='as', patience=None, stats=None):
+    rng = np.random.default_rng(rng)
+    dist = np.asarray(map, dtype=float)
+    if isinstance(strategy, str):
+        strategy = Strategy(strategy)
+    pheromone = initial_pheromone(dist, start_city, strategy, evaporation, Q) # pheromone trails between every city pair
+    eta_beta = heuristic_weights(dist, beta)
+    candidates = prepare_candidates(dist, start_city, candidates)
+
+    best_path, total_cost = run_colony(dist, eta_beta, pheromone, start_city, n_ants, n_iterations,
+                                       alpha, evaporation, Q, rng, candidates, strategy, patience, stats)
     if not best_path:
         return [], -1
     return best_path, total_cost
 
 
-def main(num_cities, density, symmetric, debug):
-    #generate cities
-    n = num_cities
-    cities = gen_cities(n)
-    if debug:
-        [print(c) for c in cities]
-
-    #generate map
-    map = gen_map(cities, n, density, symmetric)
-    if debug:
-        print("Map:")
-        map_print(n, map)
-    
+def share_array(shape, data):
+    # copy data into a new shared memory block that worker processes can attach to
+    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+    array = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    array[:] = data
+    return shm, array
 
-    #TSP
-    start_city = 0 
-    
-    start_time = time.time()
-    path, cost = aco(map, 
-                     start_city, 
-                     n_ants=100, 
-                     n_iterations=1000, 
-                     alpha=1, # controls how strongly the ant relies on the pheromone trail
-                     beta=1, # controls how strongly the ant relies on heuristic (distance)
-                     evaporation = 0.1, 
-                     Q=1 # pheromone deposit
-                     )
-    end_time = time.time()
-    aco_time = end_time - start_time
-    print(f"ACO\nTime: {aco_time}\nCost: {cost:.4f}\nPath: {path}\n")
-
-    start_time = time.time()
-    path, cost = astar(map, start_city)
-    end_time = time.time()
-    astar_time = end_time - start_time
-    print(f"A*\nTime: {astar_time}\nCost: {cost:.4f}\nPath: {path}\n")
-
-    start_time = time.time()
-    bfs_path, bfs_cost = tsp_bfs(map, start_city)
-    end_time = time.time()
-    bfs_time = end_time - start_time
-    print(f"BFS\nTime: {bfs_time}\nCost: {bfs_cost:.4f}\nPath: {bfs_path}\n")
-
-    start_time = time.time()
-    dfs_path, dfs_cost = tsp_dfs(map, start_city)
-    end_time = time.time()
-    dfs_time = end_time - start_time
-    print(f"DFS\nTime: {dfs_time}\nCost: {dfs_cost:.4f}\nPath: {dfs_path}\n")
-
-    start_time = time.time()
-    nn_path, nn_cost = tsp_nn(map, start_city)
-    end_time = time.time()
-    nn_time = end_time - start_time
-    print(f"NN\nTime: {nn_time}\nCost: {nn_cost:.4f}\nPath: {nn_path}\n")
-
-    start_time = time.time()
-    greedy_path, greedy_cost = tsp_greedy(map, start_city)
-    end_time = time.time()
-    greedy_time = end_time - start_time
-    print(f"Greedy\nTime: {greedy_time}\nCost: {greedy_cost:.4f}\nPath: {greedy_path}\n")
+# per-process view of the shared dist and pheromone blocks
+worker_state = {}
+
+def init_worker(dist_name, pheromone_name, pheromone_shape, start_city, alpha, beta, evaporation, Q, candidates, strategy):
+    n = pheromone_shape[-1]
+    pheromone_shm = shared_memory.SharedMemory(name=pheromone_name)
+    if dist_name.endswith('.npy'):
+        # a map saved by load_instance, mapped straight from the file
+        dist_shm = None
+        dist = np.load(dist_name, mmap_mode='r')
+    else:
+        dist_shm = shared_memory.SharedMemory(name=dist_name)
+        dist = np.ndarray((n, n), dtype=np.float64, buffer=dist_shm.buf)
+    worker_state.update(
+        shm=(dist_shm, pheromone_shm), # keep the blocks mapped for the life of the worker
+        dist=dist,
+        eta_beta=heuristic_weights(dist, beta),
+        pheromone=np.ndarray(pheromone_shape, dtype=np.float64, buffer=pheromone_shm.buf),
+        start_city=start_city, alpha=alpha, evaporation=evaporation, Q=Q,
+        candidates=candidates, strategy=strategy,
+    )
+
+def sync_worker(n_ants, seed):
+    # one share of the ants for one iteration, read against the shared pheromone;
+    # ACS local updates go to a private copy, the parent applies them to the shared
+    # matrix once every worker is done, so no worker writes what another is reading
+    st = worker_state
+    strategy = st['strategy']
+    local = (strategy.xi, strategy.tau0) if strategy.name == 'acs' else None
+    pheromone = st['pheromone'].copy() if local is not None else st['pheromone']
+    tours, lengths = build_tours(st['dist'], st['eta_beta'], pheromone, st['start_city'],
+                                 n_ants, st['alpha'], np.random.default_rng(seed), st['candidates'],
+                                 strategy.q0, local)
+    done = np.isfinite(lengths)
+    return tours[done], lengths[done]
+
+def island_worker(island, n_ants, n_iterations, seed, migrant, migrant_cost):
+    # K iterations of one independent colony on its own slice of the shared pheromone,
+    # after reinforcing the best tour found by any island so far
+    st = worker_state
+    pheromone = st['pheromone'][island]
+    if migrant:
+        path = np.asarray(migrant)
+        pheromone[path[:-1], path[1:]] += st['Q'] / migrant_cost
+    return run_colony(st['dist'], st['eta_beta'], pheromone, st['start_city'], n_ants, n_iterations,
+                      st['alpha'], st['evaporation'], st['Q'], np.random.default_rng(seed), st['candidates'],
+                      st['strategy'])
+
+def aco_parallel(map, start_city, n_ants, n_iterations, alpha, beta, evaporation, Q, rng=None, candidates=None,
+                 strategy='as', workers=None, mode='sync', exchange_every=10):
+    # mode='sync': the n_ants of every iteration are split across workers and merged
+    #   into one shared pheromone matrix after each iteration
+    # mode='island': every worker runs its own colony of n_ants, best tours are
+    #   exchanged every exchange_every iterations
+    n = len(map)
+    dist = np.asarray(map, dtype=float)
+    workers = workers or os.cpu_count()
+    if isinstance(rng, np.random.Generator):
+        rng = int(rng.integers(2 ** 63)) # root entropy drawn from the caller's generator
+    seeds = np.random.SeedSequence(rng)
+    candidates = prepare_candidates(dist, start_city, candidates)
+    if isinstance(strategy, str):
+        strategy = Strategy(strategy)
+    shape = (n, n) if mode == 'sync' else (workers, n, n)
+
+    best_path = []
+    total_cost = np.inf
+    if isinstance(map, np.memmap) and map.shape == (n, n) and map.dtype == np.float64 and map.flags.c_contiguous:
+        # memory-mapped map from load_instance: workers open the same file
+        dist_shm, dist_name = None, map.filename
+    else:
+        dist_shm, _ = share_array((n, n), dist)
+        dist_name = dist_shm.name
+    pheromone_shm, pheromone = share_array(shape, initial_pheromone(dist, start_city, strategy, evaporation, Q))
+    try:
+        with ProcessPoolExecutor(workers, initializer=init_worker,
+                                 initargs=(dist_name, pheromone_shm.name, shape, start_city,
+                                           alpha, beta, evaporation, Q, candidates, strategy)) as pool:
+            if mode == 'sync':
+                shares = [len(a) for a in np.array_split(np.arange(n_ants), workers) if len(a)]
+                for _ in range(n_iterations):
+                    jobs = [pool.submit(sync_worker, k, seed) for k, seed in zip(shares, seeds.spawn(len(shares)))]
+                    results = [job.result() for job in jobs]
+                    tours = np.concatenate([r[0] for r in results])
+                    lengths = np.concatenate([r[1] for r in results])
+
+                    # update global best
+                    if len(lengths):
+                        best = int(np.argmin(lengths))
+                        if lengths[best] < total_cost:
+                            best_path = tours[best].tolist()
+                            total_cost = lengths[best]
+
+                    if strategy.name == 'acs':
+                        local_update(pheromone, tours, strategy.xi, strategy.tau0)
+                    update_pheromone(pheromone, tours, lengths, best_path, total_cost, strategy, evaporation, Q)
+
+            elif mode == 'island':
+                done = 0
+                while done < n_iterations:
+                    k = min(exchange_every, n_iterations - done)
+                    jobs = [pool.submit(island_worker, island, n_ants, k, seed, best_path, total_cost)
+                            for island, seed in enumerate(seeds.spawn(workers))]
+                    for job in jobs:
+                        path, cost = job.result()
+                        if cost < total_cost:
+                            best_path, total_cost = path, cost
+                    done += k
+            else:
+                raise ValueError(f"Unknown mode: {mode}")
+    finally:
+        del pheromone
+        if dist_shm is not None:
+            dist_shm.close()
+            dist_shm.unlink()
+        pheromone_shm.close()
+        pheromone_shm.unlink()
+
+    if not best_path:
+        return [], -1
+    return best_path, total_cost
+
+
+def main(num_cities, density, symmetric, debug):
+    # imported here because benchmark imports this module
+    from benchmark import lab_main
+    solvers = ['aco_as', 'aco_mmas', 'aco_acs', 'astar_min_edge',
+               'bfs', 'dfs', 'nn', 'greedy']
+    lab_main(solvers, num_cities, density, symmetric, debug)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,428 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit # optional, compiles the population decoder
+except ImportError:
+    njit = None
+
+# Job shop GA: a chromosome lists every operation as its job id, job j appearing
+# once per operation; the k-th occurrence of j is operation k of job j.
+
+class Instance:
+    # jobs packed into (num_jobs, max_ops) arrays; resource is -1 past the last
+    # operation of a job, so jobs may have different numbers of operations
+    def __init__(self, resource, duration, name=None):
+        self.resource = np.asarray(resource, dtype=np.int64)
+        self.duration = np.asarray(duration, dtype=np.int64)
+        self.name = name
+        self.ops_per_job = (self.resource >= 0).sum(axis=1)
+        self.num_machines = int(self.resource.max()) + 1
+
+    @classmethod
+    def from_jobs(cls, jobs, name=None):
+        # jobs as lists of {'resource': R, 'time': T} dicts, resources relabelled 0..m-1
+        max_ops = max(len(job) for job in jobs)
+        resource = np.full((len(jobs), max_ops), -1, dtype=np.int64)
+        duration = np.zeros((len(jobs), max_ops), dtype=np.int64)
+        for job_id, job in enumerate(jobs):
+            resource[job_id, :len(job)] = [op['resource'] for op in job]
+            duration[job_id, :len(job)] = [op['time'] for op in job]
+        real = resource >= 0
+        resource[real] = np.unique(resource[real], return_inverse=True)[1]
+        return cls(resource, duration, name)
+
+    @property
+    def num_jobs(self):
+        return len(self.resource)
+
+    @property
+    def num_ops(self):
+        return int(self.ops_per_job.sum())
+
+    def genes(self):
+        # the multiset of job ids every chromosome is a permutation of
+        return np.repeat(np.arange(self.num_jobs), self.ops_per_job)
+
+def load_excel(path):
+    # GA_task.xlsx layout: a title row, a header row, then per job an R and a T column;
+    # empty cells at the bottom of a job's columns mean it has fewer operations
+    data = pd.read_excel(path, skiprows=1, header=None).iloc[1:]
+    jobs = []
+    for r_col in range(0, data.shape[1] - 1, 2):
+        ops = data.iloc[:, [r_col, r_col + 1]].dropna()
+        jobs.append([{'resource': int(r), 'time': int(t)} for r, t in ops.itertuples(index=False)])
+    return Instance.from_jobs(jobs, os.path.basename(path))
+
+def load_text(path):
+    # OR-Library format: "num_jobs num_machines", then one line per job of
+    # (machine, time) pairs, machines from 0; lines may have different lengths.
+    # Taillard format: the sizes line, then a "Times" block and a "Machines" block
+    # of num_jobs rows each, machines from 1.
+    # only the first instance of a file holding several is read
+    with open(path) as f:
+        lines = [line.split() for line in f if line.strip()]
+    numeric = [all(x.lstrip('-').isdigit() for x in line) for line in lines]
+    rows = [[int(x) for x in line] for line, num in zip(lines, numeric) if num]
+    num_jobs = rows[0][0]
+    labels = [line[0].lower() if not num else None for line, num in zip(lines, numeric)]
+    if 'times' in labels and 'machines' in labels:
+        def block(label):
+            at = labels.index(label) + 1
+            return [[int(x) for x in line] for line in lines[at:at + num_jobs]]
+        jobs = [[{'resource': m - 1, 'time': t} for m, t in zip(ms, ts)]
+                for ts, ms in zip(block('times'), block('machines'))]
+    else:
+        jobs = [[{'resource': row[k], 'time': row[k + 1]} for k in range(0, len(row) - 1, 2)]
+                for row in rows[1:num_jobs + 1]]
+    return Instance.from_jobs(jobs, os.path.basename(path))
+
+def load_instance(path, cache=True):
+    # Excel or text instance; with cache the packed arrays are kept next to it as
+    # <name>.npy and reused until the source file changes
+    cached = os.path.splitext(path)[0] + '.npy'
+    if cache and os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(path):
+        resource, duration = np.load(cached)
+        return Instance(resource, duration, os.path.basename(path))
+    if path.endswith(('.xlsx', '.xls')):
+        instance = load_excel(path)
+    else:
+        instance = load_text(path)
+    if cache:
+        np.save(cached, np.stack((instance.resource, instance.duration)))
+    return instance
+
+def operation_index(population):
+    # operation number of every gene: how many genes of the same job come before it
+    P, n_ops = population.shape
+    order = np.argsort(population, axis=1, kind='stable')
+    sorted_jobs = np.take_along_axis(population, order, axis=1)
+    starts = np.ones((P, n_ops), dtype=bool)
+    starts[:, 1:] = sorted_jobs[:, 1:] != sorted_jobs[:, :-1]
+    first = np.zeros_like(sorted_jobs)
+    first[starts] = np.nonzero(starts)[1]
+    np.maximum.accumulate(first, axis=1, out=first)
+    op = np.empty_like(population)
+    np.put_along_axis(op, order, np.arange(n_ops) - first, axis=1)
+    return op
+
+def decode_population_numpy(population, resource, duration, num_machines):
+    # semi-active schedule of a (P, n_ops) population at once: step t schedules gene t
+    # of every chromosome together, each operation as soon as its job and machine are free
+    P, n_ops = population.shape
+    num_jobs = len(resource)
+    op = operation_index(population)
+
+    # flat indices into per-chromosome job and machine times, one row per step
+    rows = np.arange(P)[:, None]
+    job_slot = (rows * num_jobs + population).T.copy()
+    machine_slot = (rows * num_machines + resource[population, op]).T.copy()
+    time = duration[population, op].T.copy()
+
+    job_end = np.zeros(P * num_jobs, dtype=np.int64)
+    machine_free = np.zeros(P * num_machines, dtype=np.int64)
+    for t in range(n_ops):
+        j, m = job_slot[t], machine_slot[t]
+        finish = np.maximum(job_end[j], machine_free[m]) + time[t]
+        job_end[j] = finish
+        machine_free[m] = finish
+    return job_end.reshape(P, num_jobs).max(axis=1)
+
+if njit is not None:
+    @njit(cache=True)
+    def decode_population_numba(population, resource, duration, num_machines):
+        # same schedule, one chromosome at a time in compiled loops
+        P, n_ops = population.shape
+        makespans = np.empty(P, dtype=np.int64)
+        next_op = np.empty(len(resource), dtype=np.int64)
+        job_end = np.empty(len(resource), dtype=np.int64)
+        machine_free = np.empty(num_machines, dtype=np.int64)
+        for p in range(P):
+            next_op[:] = 0
+            job_end[:] = 0
+            machine_free[:] = 0
+            for t in range(n_ops):
+                job = population[p, t]
+                op = next_op[job]
+                res = resource[job, op]
+                finish = max(job_end[job], machine_free[res]) + duration[job, op]
+                job_end[job] = finish
+                machine_free[res] = finish
+                next_op[job] = op + 1
+            makespans[p] = job_end.max()
+        return makespans
+
+# end of the open slots of a machine timeline, later than any schedule
+NEVER = np.int64(1) << 62
+
+def decode_population_active(population, resource, duration, num_machines):
+    # active schedule: each operation goes into the earliest idle gap of its machine
+    # that starts after its job is free and is long enough, else after the machine's
+    # last operation. Every machine keeps its operations sorted by start time in a row
+    # of start / end arrays padded with NEVER; step t places gene t of every chromosome
+    P, n_ops = population.shape
+    op = operation_index(population)
+    machine = resource[population, op]
+    time = duration[population, op]
+    slots = np.bincount(resource[resource >= 0], minlength=num_machines).max() # most operations on one machine
+
+    rows = np.arange(P)
+    start = np.full((P, num_machines, slots), NEVER)
+    end = np.full((P, num_machines, slots), NEVER)
+    job_end = np.zeros((P, len(resource)), dtype=np.int64)
+    for t in range(n_ops):
+        j, m, d = population[:, t], machine[:, t], time[:, t]
+        s, e = start[rows, m], end[rows, m]
+
+        # gap k lies between operation k - 1 and operation k of the machine; past the
+        # last operation the previous end is NEVER, so no slot after it fits
+        prev_end = np.zeros_like(e)
+        prev_end[:, 1:] = e[:, :-1]
+        begin = np.maximum(job_end[rows, j][:, None], prev_end)
+        k = np.argmax(begin + d[:, None] <= s, axis=1)
+        begin = begin[rows, k]
+
+        # shift the operations from slot k on one slot to the right
+        after = np.arange(slots) > k[:, None]
+        s[:, 1:] = np.where(after[:, 1:], s[:, :-1], s[:, 1:])
+        e[:, 1:] = np.where(after[:, 1:], e[:, :-1], e[:, 1:])
+        s[rows, k] = begin
+        e[rows, k] = begin + d
+        start[rows, m] = s
+        end[rows, m] = e
+        job_end[rows, j] = begin + d
+    return job_end.max(axis=1)
+
+def decode_population_gt(population, resource, duration, num_machines, delta=1.0):
+    # Giffler-Thompson: build the schedule forward in time; at each step take the
+    # unscheduled operation that can finish first, and among the operations on its
+    # machine that can start before that (delta=1, an active schedule) or before the
+    # machine's earliest start (delta=0, a non-delay schedule) schedule the one whose
+    # gene comes first in the chromosome
+    P, n_ops = population.shape
+    num_jobs = len(resource)
+    op = operation_index(population)
+
+    # position of operation k of job j in every chromosome
+    position = np.full((P, num_jobs, resource.shape[1] + 1), NEVER)
+    rows = np.arange(P)[:, None]
+    position[rows, population, op] = np.arange(n_ops)
+
+    rows = np.arange(P)
+    jobs = np.arange(num_jobs)
+    num_ops = (resource >= 0).sum(axis=1)
+    next_op = np.zeros((P, num_jobs), dtype=np.int64)
+    job_end = np.zeros((P, num_jobs), dtype=np.int64)
+    machine_free = np.zeros((P, num_machines), dtype=np.int64)
+    padded = np.concatenate((resource, np.zeros((num_jobs, 1), dtype=resource.dtype)), axis=1)
+    padded_time = np.concatenate((duration, np.zeros((num_jobs, 1), dtype=duration.dtype)), axis=1)
+    for _ in range(n_ops):
+        # earliest start and finish of the next operation of every job, NEVER when done
+        done = next_op >= num_ops
+        machine = padded[jobs, next_op]
+        est = np.maximum(job_end, machine_free[rows[:, None], machine])
+        finish = np.where(done, NEVER, est + padded_time[jobs, next_op])
+
+        first = np.argmin(finish, axis=1)
+        m = machine[rows, first]
+        on_m = (machine == m[:, None]) & ~done
+        earliest = np.where(on_m, est, NEVER).min(axis=1)
+        limit = earliest + delta * (finish[rows, first] - earliest)
+        conflict = on_m & (est < limit[:, None]) if delta > 0 else on_m & (est == earliest[:, None])
+
+        priority = np.where(conflict, position[rows[:, None], jobs, next_op], NEVER)
+        j = np.argmin(priority, axis=1)
+        end = est[rows, j] + padded_time[j, next_op[rows, j]]
+        job_end[rows, j] = end
+        machine_free[rows, m] = end
+        next_op[rows, j] += 1
+    return job_end.max(axis=1)
+
+DECODERS = ('semi_active', 'active', 'giffler_thompson')
+
+def decode_population(population, instance, decoder='semi_active'):
+    # makespan of every chromosome; the semi-active decoder uses the Numba kernel when
+    # it is available
+    population = np.asarray(population, dtype=np.int64)
+    args = (population, instance.resource, instance.duration, instance.num_machines)
+    if decoder == 'active':
+        return decode_population_active(*args)
+    if decoder == 'giffler_thompson':
+        return decode_population_gt(*args)
+    if decoder != 'semi_active':
+        raise ValueError(f"Unknown decoder: {decoder}")
+    if njit is not None:
+        return decode_population_numba(*args)
+    return decode_population_numpy(*args)
+
+def decode_and_evaluate(chromosome, instance, decoder='semi_active'):
+    return int(decode_population(np.asarray(chromosome)[None, :], instance, decoder)[0])
+
+class FitnessCache:
+    # bounded LRU of makespans. key='sequence' keys a chromosome by its genes;
+    # key='schedule' by the job order on every machine, which fixes the semi-active
+    # schedule, so chromosomes that only differ in how operations on different
+    # machines interleave share one entry. Only the semi-active decoder is fixed by
+    # the machine orders, so the other decoders default to key='sequence'
+    def __init__(self, instance, maxsize=10_000, key=None, decoder='semi_active'):
+        if key is None:
+            key = 'schedule' if decoder == 'semi_active' else 'sequence'
+        if key not in ('sequence', 'schedule'):
+            raise ValueError(f"Unknown key: {key}")
+        if key == 'schedule' and decoder != 'semi_active':
+            raise ValueError(f"key='schedule' does not identify {decoder} schedules")
+        self.instance = instance
+        self.maxsize = maxsize
+        self.key = key
+        self.decoder = decoder
+        self.dtype = np.uint8 if instance.num_jobs <= 256 else np.uint16 if instance.num_jobs <= 1 << 16 else np.int64
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def keys(self, population):
+        if self.key == 'schedule':
+            machine = self.instance.resource[population, operation_index(population)]
+            population = np.take_along_axis(population, np.argsort(machine, axis=1, kind='stable'), axis=1)
+        return [row.tobytes() for row in population.astype(self.dtype)]
+
+    def evaluate(self, population):
+        # makespans of the population, decoding only chromosomes not seen before;
+        # copies within the population are decoded once and count as hits
+        population = np.asarray(population, dtype=np.int64)
+        fitnesses = np.empty(len(population), dtype=np.int64)
+        missing = {}
+        for i, k in enumerate(self.keys(population)):
+            if k in self.data:
+                self.data.move_to_end(k)
+                fitnesses[i] = self.data[k]
+                self.hits += 1
+            elif k in missing:
+                missing[k].append(i)
+                self.hits += 1
+            else:
+                missing[k] = [i]
+                self.misses += 1
+        if missing:
+            firsts = [idx[0] for idx in missing.values()]
+            decoded = decode_population(population[firsts], self.instance, self.decoder)
+            for (k, idx), fitness in zip(missing.items(), decoded):
+                fitnesses[idx] = fitness
+                self.data[k] = int(fitness)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return fitnesses
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate, 'size': len(self.data)}
+
+class GAParams:
+    # GA settings, defaults as in the lab notebook; decoder is one of DECODERS
+    def __init__(self, pop_size=30, generations=100, crossover_rate=0.9, mutation_rate=0.2,
+                 tournament_size=3, num_swaps=5, decoder='semi_active'):
+        self.pop_size = pop_size
+        self.generations = generations
+        self.crossover_rate = crossover_rate
+        self.mutation_rate = mutation_rate
+        self.tournament_size = tournament_size
+        self.num_swaps = num_swaps
+        self.decoder = decoder
+
+    def __repr__(self):
+        return f"GAParams({', '.join(f'{k}={v}' for k, v in vars(self).items())})"
+
+def random_population(instance, size, rng):
+    genes = instance.genes()
+    return rng.permuted(np.tile(genes, (size, 1)), axis=1)
+
+def tournament(fitnesses, k, rng):
+    # index of the best of k distinct random chromosomes
+    picks = rng.choice(len(fitnesses), size=k, replace=False)
+    return picks[np.argmin(fitnesses[picks])]
+
+def crossover(parent1, parent2, instance, rng):
+    # parent1[a:b] is kept in place, the other positions take parent2's genes in order,
+    # skipping those whose job already has all its operations
+    size = len(parent1)
+    a, b = np.sort(rng.choice(size, size=2, replace=False))
+    need = instance.ops_per_job - np.bincount(parent1[a:b], minlength=instance.num_jobs)
+    rest = parent2[operation_index(parent2[None, :])[0] < need[parent2]]
+    return np.concatenate((rest[:a], parent1[a:b], rest[a:]))
+
+def mutate(chrom, num_swaps, rng):
+    # swap two random genes num_swaps times
+    for _ in range(num_swaps):
+        a, b = rng.choice(len(chrom), size=2, replace=False)
+        chrom[a], chrom[b] = chrom[b], chrom[a]
+
+def breed(population, fitnesses, instance, params, rng):
+    # next generation: tournament parents, crossover and mutation for every child
+    new_population = np.empty_like(population)
+    for i in range(params.pop_size):
+        p1 = tournament(fitnesses, params.tournament_size, rng)
+        p2 = tournament(fitnesses, params.tournament_size, rng)
+        for _ in range(10): # a small or converged population may keep returning p1
+            if p2 != p1:
+                break
+            p2 = tournament(fitnesses, params.tournament_size, rng)
+        if rng.random() < params.crossover_rate:
+            child = crossover(population[p1], population[p2], instance, rng)
+        else:
+            child = population[p1].copy()
+        if rng.random() < params.mutation_rate:
+            mutate(child, params.num_swaps, rng)
+        new_population[i] = child
+    return new_population
+
+def run_ga(instance, params=None, seed=None, stats=None, cache=None):
+    # GA from a random population; returns the best chromosome seen in any
+    # generation and its makespan, stats['history'] gets the best per generation.
+    # With a FitnessCache (or cache=True for a default one) repeated chromosomes are
+    # not decoded again; stats['hit_rates'] gets its hit rate per generation and
+    # stats['cache'] its totals
+    if params is None:
+        params = GAParams()
+    elif isinstance(params, dict):
+        params = GAParams(**params)
+    rng = np.random.default_rng(seed)
+    if cache is True:
+        cache = FitnessCache(instance, decoder=params.decoder)
+    elif cache is not None and cache.decoder != params.decoder:
+        raise ValueError(f"cache holds {cache.decoder} makespans, the GA decodes {params.decoder}")
+    hit_rates = []
+
+    def evaluate(population):
+        if cache is None:
+            return decode_population(population, instance, params.decoder)
+        hits = cache.hits
+        fitnesses = cache.evaluate(population)
+        hit_rates.append((cache.hits - hits) / len(population))
+        return fitnesses
+
+    population = random_population(instance, params.pop_size, rng)
+    fitnesses = evaluate(population)
+    history = []
+    best_chrom, best_time = None, np.inf
+    for gen in range(params.generations + 1):
+        if gen:
+            population = breed(population, fitnesses, instance, params, rng)
+            fitnesses = evaluate(population)
+        best = int(np.argmin(fitnesses))
+        history.append(int(fitnesses[best]))
+        if fitnesses[best] < best_time:
+            best_chrom, best_time = population[best].copy(), int(fitnesses[best])
+
+    if stats is not None:
+        stats['history'] = history
+        if cache is not None:
+            stats['hit_rates'] = hit_rates
+            stats['cache'] = cache.info()
+    return best_chrom.tolist(), best_time
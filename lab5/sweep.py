@@ -0,0 +1,114 @@
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from lab5.jssp import GAParams, Instance, load_instance, run_ga
+
+# Parameter sweeps of the GA: every (config, seed) pair is one job on a process pool,
+# all workers read the instance from one shared memory block, and each finished run
+# becomes a row of the results table as soon as it arrives.
+
+def grid(**values):
+    # GAParams for every combination of the given lists, other settings at their defaults,
+    # e.g. grid(pop_size=[20, 40], mutation_rate=[0.1, 0.3])
+    names = list(values)
+    return [GAParams(**dict(zip(names, combo))) for combo in itertools.product(*values.values())]
+
+def share_instance(instance):
+    # resource and duration stacked into one shared int64 block
+    data = np.stack((instance.resource, instance.duration))
+    shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    np.ndarray(data.shape, dtype=np.int64, buffer=shm.buf)[:] = data
+    return shm, data.shape
+
+# per-process view of the shared instance
+sweep_state = {}
+
+def init_sweep_worker(shm_name, shape, name):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.int64, buffer=shm.buf)
+    data.flags.writeable = False
+    sweep_state.update(shm=shm, instance=Instance(data[0], data[1], name)) # keep the block mapped
+
+def sweep_job(config, params, seed, rung, cache):
+    start_time = time.perf_counter()
+    stats = {}
+    _, best_time = run_ga(sweep_state['instance'], params, seed, stats, cache or None)
+    row = dict(config=config, rung=rung, seed=seed, **vars(params), best_time=best_time,
+               time=time.perf_counter() - start_time)
+    if cache:
+        row['hit_rate'] = stats['cache']['hit_rate']
+    return row
+
+def sweep(instance, configs, seeds=range(5), workers=None, eta=None, min_seeds=1, out=None, cache=False,
+          verbose=True):
+    # run every config on every seed; the same seeds are used for every config, so the
+    # configs are compared on the same initial populations.
+    # With eta, successive halving over seeds: rung 0 runs every config on min_seeds
+    # seeds, then only the best 1/eta of the configs by mean makespan go on to a rung
+    # with eta times as many seeds, until the seeds run out or one config is left.
+    # Rows are appended to the .csv out as they finish, so a long sweep can be watched
+    # or cut short without losing results. cache=True runs the GA with a FitnessCache
+    # and adds its hit rate to every row.
+    if isinstance(instance, str):
+        instance = load_instance(instance)
+    configs = [GAParams(**c) if isinstance(c, dict) else c for c in configs]
+    seeds = list(seeds)
+    if eta is not None and not (eta > 1 and min_seeds >= 1):
+        raise ValueError("successive halving needs eta > 1 and min_seeds >= 1")
+    if eta is None:
+        schedule = [len(seeds)]
+    else:
+        schedule = []
+        k = min_seeds
+        while k < len(seeds):
+            schedule.append(k)
+            k = max(k + 1, int(k * eta))
+        schedule.append(len(seeds))
+
+    rows = []
+    alive = list(range(len(configs)))
+    shm, shape = share_instance(instance)
+    try:
+        with ProcessPoolExecutor(workers or os.cpu_count(), initializer=init_sweep_worker,
+                                 initargs=(shm.name, shape, instance.name)) as pool:
+            done = 0
+            for rung, k in enumerate(schedule):
+                jobs = [pool.submit(sweep_job, c, configs[c], seed, rung, cache)
+                        for c in alive for seed in seeds[done:k]]
+                for job in as_completed(jobs):
+                    row = job.result()
+                    rows.append(row)
+                    if out:
+                        pd.DataFrame([row]).to_csv(out, mode='a', index=False, header=not os.path.exists(out))
+                    if verbose:
+                        print(f"config {row['config']} seed {row['seed']} rung {rung}: "
+                              f"{row['best_time']} ({row['time']:.2f}s)")
+                done = k
+
+                # keep the best ceil(len / eta) configs by mean makespan over the seeds so far
+                if eta is not None and rung < len(schedule) - 1:
+                    table = pd.DataFrame(rows)
+                    means = table[table['config'].isin(alive)].groupby('config')['best_time'].mean()
+                    alive = sorted(means.nsmallest(max(1, math.ceil(len(alive) / eta))).index)
+                    if len(alive) == 1:
+                        break
+    finally:
+        shm.close()
+        shm.unlink()
+    return pd.DataFrame(rows)
+
+def summary(results):
+    # one row per config, best mean makespan first; runs is how many seeds it got
+    params = [c for c in results.columns if c not in ('config', 'rung', 'seed', 'best_time', 'time', 'hit_rate')]
+    return (results.groupby(['config'] + params)
+            .agg(mean=('best_time', 'mean'), std=('best_time', 'std'), best=('best_time', 'min'),
+                 runs=('seed', 'count'), time=('time', 'mean'))
+            .reset_index()
+            .sort_values(['runs', 'mean'], ascending=[False, True], ignore_index=True))
@@ -1,4 +1,7 @@
-import random
+import os
+import time
+
+import numpy as np
 import pandas as pd
 
 class City:
@@ -10,19 +13,58 @@ class City:
     def __str__(self):
         return f"{self.name} ({self.x}, {self.y}, {self.z})"
 
-def gen_coordinates():
-    x = random.uniform(-100, 100)
-    y = random.uniform(-100, 100)
-    z = random.uniform(0, 50)
-    return x, y, z
+class Cities:
+    # structure-of-arrays city store: one (n, 3) float array of x, y, z
+    # plus an optional name table, 24 bytes per city without names
+    def __init__(self, coords, names=None):
+        self.coords = np.ascontiguousarray(coords, dtype=np.float64)
+        self.names = names
+
+    @classmethod
+    def generate(cls, n, rng=None):
+        rng = np.random.default_rng(rng)
+        coords = np.empty((n, 3))
+        coords[:, :2] = rng.uniform(-100, 100, (n, 2))
+        coords[:, 2] = rng.uniform(0, 50, n)
+        return cls(coords)
+
+    @property
+    def x(self):
+        return self.coords[:, 0]
+
+    @property
+    def y(self):
+        return self.coords[:, 1]
+
+    @property
+    def z(self):
+        return self.coords[:, 2]
+
+    def name(self, i):
+        return self.names[i] if self.names is not None else f"city{i}"
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __getitem__(self, i):
+        # an int gives a single City, a slice gives a Cities view sharing coords
+        if isinstance(i, (int, np.integer)):
+            x, y, z = self.coords[i]
+            return City(self.name(i), x, y, z)
+        names = None if self.names is None else np.asarray(self.names)[i]
+        return Cities(self.coords[i], names)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None or np.dtype(dtype) == self.coords.dtype:
+            return self.coords
+        return self.coords.astype(dtype)
 
-def gen_cities(n):
-    cities = []
-    for i in range(n):
-        x, y, z = gen_coordinates()
-        name = f"city{i}"
-        cities.append(City(name, x, y, z))
-    return cities
+def gen_cities(n, rng=None):
+    return Cities.generate(n, rng)
 
 def map_print(n, map):
     df = pd.DataFrame(map)
@@ -36,20 +78,240 @@ def euclidean_distance(city1, city2):
     distance = ((city1.x - city2.x)**2 + (city1.y - city2.y)**2 + (city1.z - city2.z)**2)**0.5
     return distance
 
-def gen_map(cities, n, density, symmetric):
-    map = [[0 for _ in range(n)] for _ in range(n)]
-    for i in range(n):
-        for j in range(n):
-            if random.random() <= density:
-                if symmetric:
-                    map[i][j] = euclidean_distance(cities[i], cities[j])
-                    map[j][i] = map[i][j]
-                else:
-                    if i != j:
-                        distance = euclidean_distance(cities[i], cities[j])
-                        if cities[i].z < cities[j].z:
-                            distance *= 1.1
-                        elif cities[i].z > cities[j].z:
-                            distance *= 0.9
-                        map[i][j] = distance
-    return map
\ No newline at end of file
+def city_coords(cities):
+    # (n, 3) float array of x, y, z for Cities, an array or a list of City objects
+    if isinstance(cities, Cities):
+        return cities.coords
+    if isinstance(cities, np.ndarray):
+        return np.ascontiguousarray(cities, dtype=np.float64)
+    return np.array([(c.x, c.y, c.z) for c in cities], dtype=np.float64)
+
+def distance_matrix(coords, symmetric=True):
+    # all pairwise euclidean distances, built axis by axis with broadcasting
+    # so only two n x n buffers are alive at once
+    n = len(coords)
+    dist = np.zeros((n, n))
+    diff = np.empty((n, n))
+    for k in range(3):
+        np.subtract.outer(coords[:, k], coords[:, k], out=diff)
+        diff *= diff
+        dist += diff
+    np.sqrt(dist, out=dist)
+    if not symmetric:
+        # going up costs +10%, going down -10%; the penalty reuses the diff buffer
+        np.subtract.outer(coords[:, 2], coords[:, 2], out=diff)
+        np.sign(diff, out=diff)
+        diff *= -0.1
+        diff += 1.0
+        dist *= diff
+    return dist
+
+def gen_map(cities, n, density, symmetric, rng=None):
+    rng = np.random.default_rng(rng)
+    coords = city_coords(cities)[:n]
+    map = distance_matrix(coords, symmetric)
+
+    # density mask: a 0 entry means there is no road
+    if density < 1:
+        roads = rng.random((n, n)) <= density
+        if symmetric:
+            roads |= roads.T
+        map[~roads] = 0.0
+    np.fill_diagonal(map, 0.0)
+    return map
+
+# on-disk instance store, one pair of .npy files per (n, density, symmetric, seed)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.instances')
+
+def instance_key(n, density, symmetric, seed):
+    return f"n{n}_d{density:g}_{'sym' if symmetric else 'asym'}_s{seed}"
+
+def load_instance(n, density, symmetric, seed, cache_dir=None, mmap_mode='r'):
+    # cities and map for (n, density, symmetric, seed), built once with a seeded rng and
+    # saved as .npy; loads memory-map the files, so repeated runs and worker processes
+    # share one copy through the page cache instead of rebuilding or pickling it
+    cache_dir = cache_dir or CACHE_DIR
+    base = os.path.join(cache_dir, instance_key(n, density, symmetric, seed))
+    paths = {'coords': base + '_coords.npy', 'map': base + '_map.npy'}
+    if not all(os.path.exists(p) for p in paths.values()):
+        rng = np.random.default_rng(seed)
+        cities = gen_cities(n, rng)
+        arrays = {'coords': cities.coords, 'map': gen_map(cities, n, density, symmetric, rng)}
+        os.makedirs(cache_dir, exist_ok=True)
+        for name, path in paths.items():
+            # write under a private name and rename, so a concurrent reader never sees half a file
+            tmp = f"{path[:-4]}.{os.getpid()}.tmp.npy"
+            np.save(tmp, arrays[name])
+            os.replace(tmp, path)
+    coords = np.load(paths['coords'], mmap_mode=mmap_mode)
+    return Cities(coords), np.load(paths['map'], mmap_mode=mmap_mode)
+
+def road_costs(map):
+    # map as a float array with inf where there is no road
+    if isinstance(map, Roads):
+        return map.to_dense()
+    w = np.asarray(map, dtype=float)
+    w = np.where(w > 0, w, np.inf)
+    np.fill_diagonal(w, np.inf)
+    return w
+
+def candidate_lists(map, k):
+    # k cheapest outgoing roads per city, nearest first, -1 where a city has fewer roads
+    w = road_costs(map)
+    n = len(w)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.intp)
+    idx = np.argpartition(w, k - 1, axis=1)[:, :k]
+    cost = np.take_along_axis(w, idx, axis=1)
+    order = np.argsort(cost, axis=1, kind='stable')
+    idx = np.take_along_axis(idx, order, axis=1)
+    idx[~np.isfinite(np.take_along_axis(cost, order, axis=1))] = -1
+    return idx
+
+def edge_costs(coords, i, j, symmetric=True):
+    # road costs between cities i and j (arrays) computed on demand from coordinates
+    coords = city_coords(coords)
+    a, b = coords[i], coords[j]
+    cost = np.sqrt(((a - b) ** 2).sum(axis=-1))
+    if not symmetric:
+        # going up costs +10%, going down -10%
+        cost = cost * (1.0 - 0.1 * np.sign(a[..., 2] - b[..., 2]))
+    return cost
+
+def has_road(i, j, density, symmetric=True, seed=0):
+    # whether the road i -> j exists, decided by hashing the city pair so any pair
+    # can be tested on demand without storing an n x n mask
+    i = np.asarray(i, dtype=np.uint64)
+    j = np.asarray(j, dtype=np.uint64)
+    if density >= 1:
+        return i != j
+    if symmetric:
+        i, j = np.minimum(i, j), np.maximum(i, j)
+    # splitmix64 finalizer over (i, j, seed), wrapping uint64 arithmetic
+    with np.errstate(over='ignore'):
+        h = (i << np.uint64(32)) ^ j ^ (np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15))
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        h = h ^ (h >> np.uint64(31))
+    u = (h >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+    return (u < density) & (i != j)
+
+class Roads:
+    # CSR road network: the roads leaving city i go to indices[indptr[i]:indptr[i+1]]
+    # and cost costs[indptr[i]:indptr[i+1]], sorted cheapest first
+    def __init__(self, indptr, indices, costs):
+        self.indptr = indptr
+        self.indices = indices
+        self.costs = costs
+
+    @classmethod
+    def from_map(cls, map):
+        # CSR form of a dense map where 0 means no road
+        w = road_costs(map)
+        src, dst = np.nonzero(np.isfinite(w))
+        return cls.from_edges(len(w), src, dst, w[src, dst])
+
+    @classmethod
+    def from_edges(cls, n, src, dst, costs):
+        order = np.lexsort((costs, src))
+        indptr = np.zeros(n + 1, dtype=np.intp)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return cls(indptr, np.asarray(dst, dtype=np.intp)[order], np.asarray(costs, dtype=float)[order])
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.costs.nbytes
+
+    def neighbours(self, i):
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        return self.indices[lo:hi], self.costs[lo:hi]
+
+    def rows(self):
+        # per-city lists of (city, cost) pairs, cheapest first, for pure Python loops
+        ptr, idx, costs = self.indptr.tolist(), self.indices.tolist(), self.costs.tolist()
+        return [list(zip(idx[ptr[i]:ptr[i + 1]], costs[ptr[i]:ptr[i + 1]])) for i in range(len(self))]
+
+    def cost(self, i, j):
+        # cost of the road i -> j, inf if there is none
+        idx, costs = self.neighbours(i)
+        k = np.flatnonzero(idx == j)
+        return float(costs[k[0]]) if len(k) else np.inf
+
+    def min_out(self):
+        # cheapest road out of every city, inf where none
+        best = np.full(len(self), np.inf)
+        has = np.diff(self.indptr) > 0
+        best[has] = self.costs[self.indptr[:-1][has]]
+        return best
+
+    def min_in(self):
+        # cheapest road into every city, inf where none
+        best = np.full(len(self), np.inf)
+        np.minimum.at(best, self.indices, self.costs)
+        return best
+
+    def to_dense(self):
+        # n x n costs with inf where there is no road, like road_costs
+        n = len(self)
+        w = np.full((n, n), np.inf)
+        w[np.repeat(np.arange(n), np.diff(self.indptr)), self.indices] = self.costs
+        return w
+
+def as_roads(map):
+    # Roads as they are, a dense map converted to CSR
+    return map if isinstance(map, Roads) else Roads.from_map(map)
+
+def gen_roads(cities, n, density, symmetric, seed=0):
+    # CSR map built block by block from coordinates, never holding an n x n array;
+    # roads come from has_road, so every road exists with probability density
+    coords = city_coords(cities)[:n]
+    block = max(1, (1 << 22) // max(n, 1))
+    src, dst, costs = [], [], []
+    for lo in range(0, n, block):
+        i, j = np.nonzero(has_road(np.arange(lo, min(lo + block, n))[:, None], np.arange(n)[None, :],
+                                   density, symmetric, seed))
+        i += lo
+        src.append(i)
+        dst.append(j)
+        costs.append(edge_costs(coords, i, j, symmetric))
+    return Roads.from_edges(n, np.concatenate(src), np.concatenate(dst), np.concatenate(costs))
+
+class Budget:
+    # wall-clock and/or node budget for the search solvers: spent() is called per
+    # expanded node (or batch of nodes), counts it and only reads the clock every
+    # check_every nodes
+    def __init__(self, time_limit=None, max_nodes=None, check_every=256):
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.max_nodes = max_nodes
+        self.check_every = check_every
+        self.next_check = check_every
+        self.nodes = 0
+        self.out = False
+
+    def spent(self, count=1):
+        self.nodes += count
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            self.out = True
+        elif self.deadline is not None and self.nodes >= self.next_check:
+            self.next_check = self.nodes + self.check_every
+            self.out = time.perf_counter() >= self.deadline
+        return self.out
+
+    def expired(self):
+        # read the clock now, for long stretches of work between spent() calls
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.out = True
+        return self.out
+
+def search_stats(stats, budget, lower_bound, **counts):
+    # shared stats of the search solvers: node counts, whether the budget ran out
+    # and a lower bound on the optimum (equal to the returned cost when not timed out)
+    if stats is not None:
+        stats.update(counts)
+        stats['nodes'] = budget.nodes
+        stats['timed_out'] = budget.out
+        stats['lower_bound'] = lower_bound